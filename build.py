@@ -6,9 +6,57 @@ from bincrafters import build_template_default
 import platform
 import copy
 import os
+import glob
+import json
+import multiprocessing
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+
+
+def collect_build_profiles(since, user_homes=None):
+    """ Loads the build_profile.json of every libcurl package built after 'since' in the given conan user homes """
+    profiles = []
+    for user_home in user_homes or [os.getenv("CONAN_USER_HOME", os.path.expanduser("~"))]:
+        pattern = os.path.join(user_home, ".conan", "data", "libcurl", "*", "*", "*", "package", "*",
+                               "build_profile.json")
+        for path in glob.glob(pattern):
+            if os.path.getmtime(path) >= since:
+                with open(path) as profile_file:
+                    profiles.append(json.load(profile_file))
+    return profiles
+
+
+def print_build_profiles(profiles):
+    """ Prints one row per configuration, slowest first, with the wall time spent in each phase """
+    rows = []
+    phase_names = []
+    for profile in profiles:
+        settings = profile["settings"]
+        options = profile["options"]
+        label = " ".join([settings.get("os", ""), settings.get("arch", ""), settings.get("compiler", ""),
+                          settings.get("compiler.version", ""), settings.get("build_type", ""),
+                          "shared" if options.get("shared") == "True" else "static"])
+        walls = {}
+        for phase in profile["phases"]:
+            walls[phase["phase"]] = walls.get(phase["phase"], 0.0) + phase["wall_seconds"]
+            if phase["phase"] not in phase_names:
+                phase_names.append(phase["phase"])
+        cpu = sum(phase["cpu_seconds"] for phase in profile["phases"])
+        rows.append((sum(walls.values()), cpu, label, walls))
+    rows.sort(key=lambda row: row[0], reverse=True)
+
+    label_width = max([len("configuration")] + [len(row[2]) for row in rows])
+    print(" | ".join(["configuration".ljust(label_width)] + phase_names + ["wall", "cpu"]))
+    for wall, cpu, label, walls in rows:
+        cells = ["%.1f" % walls[name] if name in walls else "-" for name in phase_names]
+        cells = [cell.rjust(len(name)) for cell, name in zip(cells, phase_names)]
+        print(" | ".join([label.ljust(label_width)] + cells + ["%.1f" % wall, "%.1f" % cpu]))
 
-if __name__ == "__main__":
 
+def get_builder():
     builder = build_template_default.get_builder(pure_c=True)
 
     items = []
@@ -48,4 +96,79 @@ if __name__ == "__main__":
 
         builder.items = items
 
-    builder.run()
+    return builder
+
+
+def item_label(item):
+    settings = item.settings
+    options = ["%s=%s" % (name.split(":")[-1], value) for name, value in sorted(item.options.items())]
+    return " ".join([settings.get("os", ""), settings.get("arch", ""), settings.get("compiler", ""),
+                     settings.get("compiler.version", ""), settings.get("build_type", "")] + options)
+
+
+def run_parallel(items, jobs, work_dir):
+    """ Builds every matrix item in a child build.py, at most 'jobs' at a time
+
+    Each concurrent worker owns a conan user home, so caches and package locks never collide. The workers share
+    one source cache (LIBCURL_SOURCE_CACHE), so the sources are downloaded once. Returns the user homes and
+    (label, returncode, log path) for every item.
+    """
+    user_homes = [os.path.join(work_dir, "worker-%d" % index) for index in range(jobs)]
+    free_homes = Queue()
+    for user_home in user_homes:
+        free_homes.put(user_home)
+    # split the cores between the workers instead of oversubscribing them
+    cpu_count = str(max(1, multiprocessing.cpu_count() // jobs))
+    source_cache = os.getenv("LIBCURL_SOURCE_CACHE", os.path.join(work_dir, "source_cache"))
+
+    def build_item(index):
+        user_home = free_homes.get()
+        try:
+            env = dict(os.environ, CONAN_USER_HOME=user_home, CONAN_CPU_COUNT=cpu_count,
+                       LIBCURL_SOURCE_CACHE=source_cache, _LIBCURL_MATRIX_ITEM=str(index))
+            log_path = os.path.join(work_dir, "item-%d.log" % index)
+            with open(log_path, "w") as log_file:
+                returncode = subprocess.call([sys.executable, os.path.abspath(__file__)], env=env,
+                                             stdout=log_file, stderr=subprocess.STDOUT)
+            print("[%s] %s" % ("PASS" if returncode == 0 else "FAIL", item_label(items[index])))
+            return item_label(items[index]), returncode, log_path
+        finally:
+            free_homes.put(user_home)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(build_item, range(len(items))))
+    return user_homes, results
+
+
+if __name__ == "__main__":
+
+    builder = get_builder()
+    jobs = int(os.getenv("LIBCURL_BUILD_JOBS", "1"))
+    start = time.time()
+
+    if os.getenv("_LIBCURL_MATRIX_ITEM"):
+        # child of a parallel run: build just one item
+        builder.items = [builder.items[int(os.getenv("_LIBCURL_MATRIX_ITEM"))]]
+        builder.run()
+    elif jobs > 1:
+        work_dir = os.path.abspath(os.getenv("LIBCURL_BUILD_WORK_DIR", "parallel_build"))
+        if not os.path.isdir(work_dir):
+            os.makedirs(work_dir)
+        user_homes, results = run_parallel(builder.items, jobs, work_dir)
+
+        profiles = collect_build_profiles(start, user_homes)
+        if profiles:
+            print_build_profiles(profiles)
+
+        failed = [result for result in results if result[1] != 0]
+        print("%d of %d configurations passed in %.1f s" % (len(results) - len(failed), len(results),
+                                                          time.time() - start))
+        for label, returncode, log_path in failed:
+            print("FAILED (%d): %s, see %s" % (returncode, label, log_path))
+        sys.exit(1 if failed else 0)
+    else:
+        builder.run()
+
+        profiles = collect_build_profiles(start)
+        if profiles:
+            print_build_profiles(profiles)
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Builds the recipe with autotools and with CMake and compares the features and protocols of both libraries
+
+Usage: python check_parity.py [user/channel] [extra conan create arguments, e.g. -o libcurl:with_nghttp2=True]
+Linux and macOS only, since those are the platforms where both build systems are available.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+# curl_version_info_data::features bits, see CURL_VERSION_* in curl.h
+FEATURES = ["IPV6", "KERBEROS4", "SSL", "LIBZ", "NTLM", "GSSNEGOTIATE", "DEBUG", "ASYNCHDNS", "SPNEGO",
+            "LARGEFILE", "IDN", "SSPI", "CONV", "CURLDEBUG", "TLSAUTH_SRP", "NTLM_WB", "HTTP2", "GSSAPI",
+            "KERBEROS5", "UNIX_SOCKETS", "PSL", "HTTPS_PROXY", "MULTI_SSL", "BROTLI", "ALTSVC", "HTTP3"]
+
+
+def feature_names(bitmask):
+    return set(name for bit, name in enumerate(FEATURES) if bitmask & (1 << bit))
+
+
+def version_info(build_system, user_channel, extra_args, work_dir):
+    output = os.path.join(work_dir, "%s.json" % build_system)
+    command = ["conan", "create", ".", user_channel, "-o", "libcurl:build_system=%s" % build_system,
+               "-e", "LIBCURL_VERSION_INFO_OUTPUT=%s" % output] + extra_args
+    print(" ".join(command))
+    subprocess.check_call(command)
+    with open(output) as version_file:
+        return json.load(version_file)
+
+
+def main(args):
+    user_channel = args[0] if args and not args[0].startswith("-") else "bincrafters/testing"
+    extra_args = args[1:] if args and not args[0].startswith("-") else args
+    work_dir = tempfile.mkdtemp()
+
+    autotools = version_info("autotools", user_channel, extra_args, work_dir)
+    cmake = version_info("cmake", user_channel, extra_args, work_dir)
+
+    differences = []
+    for kind, autotools_values, cmake_values in [
+            ("features", feature_names(autotools["features"]), feature_names(cmake["features"])),
+            ("protocols", set(autotools["protocols"]), set(cmake["protocols"]))]:
+        only_autotools = sorted(autotools_values - cmake_values)
+        only_cmake = sorted(cmake_values - autotools_values)
+        if only_autotools:
+            differences.append("%s only in the autotools build: %s" % (kind, ", ".join(only_autotools)))
+        if only_cmake:
+            differences.append("%s only in the CMake build: %s" % (kind, ", ".join(only_cmake)))
+    if bool(autotools["ssl_version"]) != bool(cmake["ssl_version"]):
+        differences.append("ssl backend: '%s' (autotools) vs '%s' (CMake)"
+                           % (autotools["ssl_version"], cmake["ssl_version"]))
+
+    for difference in differences:
+        print(difference)
+    if not differences:
+        print("autotools and CMake builds match: %s" % ", ".join(sorted(feature_names(cmake["features"]))))
+    return 1 if differences else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
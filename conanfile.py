@@ -1,8 +1,23 @@
-from conans.errors import ConanInvalidConfiguration
+from conans.errors import ConanException, ConanInvalidConfiguration
+from contextlib import contextmanager
+import glob
+import hashlib
+import json
 import os
 import re
 import shutil
+import subprocess
+import sys
+import time
+from urllib.parse import urlparse
+from urllib.request import url2pathname
 from conans import ConanFile, AutoToolsBuildEnvironment, RunEnvironment, CMake, tools
+import pgo_training
+try:
+    import resource
+except ImportError:
+    # not available on Windows, peak memory is not recorded there
+    resource = None
 
 
 class LibcurlConan(ConanFile):
@@ -13,7 +28,7 @@ class LibcurlConan(ConanFile):
     url = "http://github.com/bincrafters/conan-libcurl"
     homepage = "http://curl.haxx.se"
     license = "MIT"
-    exports = ["LICENSE.md"]
+    exports = ["LICENSE.md", "pgo_training.py"]
     exports_sources = ["lib_Makefile_add.am", "CMakeLists.txt"]
     generators = "cmake"
 
@@ -22,48 +37,118 @@ class LibcurlConan(ConanFile):
                "fPIC": [True, False],
                "with_openssl": [True, False],
                "with_winssl": [True, False],
+               "with_mbedtls": [True, False],
+               "with_wolfssl": [True, False],
                "disable_threads": [True, False],
                "with_ldap": [True, False],
                "with_ca_bundle": "ANY",
                "with_ca_path": "ANY",
+               "ca_hashed_dir": [True, False],
                "darwin_ssl": [True, False],
                "with_libssh2": [True, False],
                "with_libidn": [True, False],
                "with_librtmp": [True, False],
                "with_libmetalink": [True, False],
                "with_libpsl": [True, False],
+               "max_write_size": "ANY",
                "with_largemaxwritesize": [True, False],
+               "max_http_header": "ANY",
                "with_largefile": [True, False],
                "with_nghttp2": [True, False],
-               "with_brotli": [True, False]}
+               "with_brotli": [True, False],
+               "with_c_ares": [True, False],
+               "build_system": ["autotools", "cmake"],
+               "lto": [True, False],
+               "pgo": [True, False],
+               "disabled_protocols": "ANY",
+               "disabled_features": "ANY",
+               "symbol_hiding": [True, False],
+               "compiler_launcher": [None, "ccache", "sccache"],
+               "profiling": [True, False],
+               "memory_tracking": [True, False],
+               "gc_sections": [True, False]}
     default_options = {'shared': False,
                        'fPIC': True,
                        'with_openssl': True,
                        'with_winssl': False,
+                       'with_mbedtls': False,
+                       'with_wolfssl': False,
                        'disable_threads': False,
                        'with_ldap': False,
                        'with_ca_bundle': None,
                        'with_ca_path': None,
+                       'ca_hashed_dir': False,
                        'darwin_ssl': True,
                        'with_libssh2': False,
                        'with_libidn': False,
                        'with_librtmp': False,
                        'with_libmetalink': False,
                        'with_libpsl': False,
+                       'max_write_size': None,
                        'with_largemaxwritesize': False,
+                       'max_http_header': None,
                        "with_largefile": True,
                        'with_nghttp2': False,
-                       'with_brotli': False
+                       'with_brotli': False,
+                       'with_c_ares': False,
+                       'build_system': 'autotools',
+                       'lto': False,
+                       'pgo': False,
+                       'disabled_protocols': None,
+                       'disabled_features': None,
+                       'symbol_hiding': True,
+                       'compiler_launcher': None,
+                       'profiling': False,
+                       'memory_tracking': False,
+                       'gc_sections': False
                        }
 
+    # values accepted by disabled_protocols / disabled_features (comma separated),
+    # mapped to their --disable-* configure flag and CURL_DISABLE_* CMake definition
+    _prunable_protocols = {"dict": ("--disable-dict", "CURL_DISABLE_DICT"),
+                           "file": ("--disable-file", "CURL_DISABLE_FILE"),
+                           "ftp": ("--disable-ftp", "CURL_DISABLE_FTP"),
+                           "gopher": ("--disable-gopher", "CURL_DISABLE_GOPHER"),
+                           "http": ("--disable-http", "CURL_DISABLE_HTTP"),
+                           "imap": ("--disable-imap", "CURL_DISABLE_IMAP"),
+                           "pop3": ("--disable-pop3", "CURL_DISABLE_POP3"),
+                           "rtsp": ("--disable-rtsp", "CURL_DISABLE_RTSP"),
+                           "smb": ("--disable-smb", "CURL_DISABLE_SMB"),
+                           "smtp": ("--disable-smtp", "CURL_DISABLE_SMTP"),
+                           "telnet": ("--disable-telnet", "CURL_DISABLE_TELNET"),
+                           "tftp": ("--disable-tftp", "CURL_DISABLE_TFTP")}
+    _prunable_features = {"cookies": ("--disable-cookies", "CURL_DISABLE_COOKIES"),
+                          "crypto_auth": ("--disable-crypto-auth", "CURL_DISABLE_CRYPTO_AUTH"),
+                          "proxy": ("--disable-proxy", "CURL_DISABLE_PROXY"),
+                          "verbose": ("--disable-verbose", "CURL_DISABLE_VERBOSE_STRINGS")}
+
+    # autoconf cache entries that depend on the configuration rather than on the toolchain: the precious
+    # variables (CFLAGS, LDFLAGS... with per-package paths) and the library probes of the dependencies
+    _configuration_cache_entries = re.compile(r'^(test "\$\{)?ac_cv_(env|lib|search)_')
+
     _source_subfolder = "source_subfolder"
+    _ca_subfolder = os.path.join("res", "certs")
+    _debug_subfolder = "debug"
+    _manifest_file = "feature_manifest.json"
     _build_subfolder = "build_subfolder"
     _autotools = False
+    _pgo_generate = False
 
     @property
     def is_mingw(self):
         return self.settings.os == "Windows" and self.settings.compiler != "Visual Studio"
 
+    @property
+    def use_cmake(self):
+        # Visual Studio is always built with CMake, Linux and macOS may opt in via build_system
+        return self.settings.compiler == "Visual Studio" or self.options.get_safe("build_system") == "cmake"
+
+    @property
+    def _uses_openssl(self):
+        if not self.options.get_safe("with_openssl"):
+            return False
+        return not self.options.get_safe("darwin_ssl") and not self.options.get_safe("with_winssl")
+
     def imports(self):
         # Copy shared libraries for dependencies to fix DYLD_LIBRARY_PATH problems
         #
@@ -91,9 +176,98 @@ class LibcurlConan(ConanFile):
             # enforce shared linking due to openssl dependency
             if self.settings.os != "Macos" or not self.options.darwin_ssl:
                 self.options["openssl"].shared = self.options.shared
+        if self.options.with_mbedtls:
+            self.options["mbedtls"].shared = self.options.shared
+        if self.options.with_wolfssl:
+            self.options["wolfssl"].shared = self.options.shared
         if self.options.with_libssh2:
             if self.settings.compiler != "Visual Studio":
                 self.options["libssh2"].shared = self.options.shared
+        if self.options.with_c_ares:
+            self.options["c-ares"].shared = self.options.shared
+
+        # mbedtls and wolfssl replace the default backend, so with_openssl and darwin_ssl have to be turned off
+        tls_backends = [option for option in ["with_openssl", "with_winssl", "with_mbedtls", "with_wolfssl"]
+                        if self.options.get_safe(option)]
+        if len(tls_backends) > 1 and ("with_mbedtls" in tls_backends or "with_wolfssl" in tls_backends):
+            raise ConanInvalidConfiguration("Specify only one of %s" % " or ".join(tls_backends))
+        if self.options.get_safe("darwin_ssl") and (self.options.with_mbedtls or self.options.with_wolfssl):
+            raise ConanInvalidConfiguration("Specify only darwin_ssl or with_mbedtls/with_wolfssl")
+
+        # symbol hiding only shrinks the dynamic symbol table of shared builds
+        if not self.options.shared and "symbol_hiding" in self.options:
+            self.options.remove("symbol_hiding")
+
+        for option, choices in [("disabled_protocols", self._prunable_protocols),
+                                ("disabled_features", self._prunable_features)]:
+            values = self._option_list(option)
+            unknown = [value for value in values if value not in choices]
+            if unknown:
+                raise ConanInvalidConfiguration("Unknown %s: %s (valid values: %s)"
+                                                % (option, ", ".join(unknown), ", ".join(sorted(choices))))
+            if values:
+                # normalize, so the same set always yields the same package id
+                setattr(self.options, option, ",".join(sorted(values)))
+
+        if self.options.with_largemaxwritesize:
+            # deprecated, it used to patch CURL_MAX_WRITE_SIZE to 10 MiB
+            self.output.warn("with_largemaxwritesize is deprecated, use max_write_size=10485760")
+            if self.options.max_write_size and str(self.options.max_write_size) != "10485760":
+                raise ConanInvalidConfiguration("with_largemaxwritesize conflicts with max_write_size=%s"
+                                                % self.options.max_write_size)
+            self.options.max_write_size = "10485760"
+
+        # upstream defaults are 16 KiB and 100 KiB, curl needs at least 1 KiB for either buffer
+        for option in ["max_write_size", "max_http_header"]:
+            value = self.options.get_safe(option)
+            if value:
+                if not str(value).isdigit() or not 1024 <= int(str(value)) <= 0x7fffffff:
+                    raise ConanInvalidConfiguration("%s must be a byte count between 1024 and 2147483647" % option)
+
+        if self.options.ca_hashed_dir and not self._uses_openssl:
+            raise ConanInvalidConfiguration("ca_hashed_dir is an OpenSSL hashed directory, it needs with_openssl")
+
+        if self.options.profiling:
+            if self.settings.compiler not in ["gcc", "clang", "apple-clang"] or self.is_mingw:
+                raise ConanInvalidConfiguration("profiling is only supported with gcc and clang on Linux and macOS")
+            if self.settings.build_type == "Debug":
+                raise ConanInvalidConfiguration("profiling keeps the optimized code, use a Release build_type")
+
+        if self.options.gc_sections and self.settings.compiler == "Visual Studio":
+            # /O2 already implies /Gy and the linker drops unreferenced functions (/OPT:REF) in release builds
+            raise ConanInvalidConfiguration("gc_sections is only supported with gcc and clang")
+
+        if self.options.compiler_launcher and self.settings.compiler == "Visual Studio":
+            raise ConanInvalidConfiguration("compiler_launcher needs the Ninja generator, not Visual Studio")
+
+        if self.use_cmake:
+            # the CMake build of this curl version has no switch for these
+            for option in ["with_libpsl", "with_libmetalink", "with_wolfssl"]:
+                if self.options.get_safe(option):
+                    raise ConanInvalidConfiguration("%s is only supported by the autotools build" % option)
+
+        if self.options.pgo:
+            if self.settings.compiler not in ["gcc", "clang", "apple-clang"] or self.is_mingw:
+                raise ConanInvalidConfiguration("pgo is only supported with gcc and clang on Linux and macOS")
+            if tools.cross_building(self.settings):
+                raise ConanInvalidConfiguration("pgo needs to run the training workload on the build machine")
+
+    def package_id(self):
+        # a compiler cache does not change the binaries
+        del self.info.options.compiler_launcher
+        # already mapped to max_write_size
+        del self.info.options.with_largemaxwritesize
+
+    def _option_list(self, option):
+        value = self.options.get_safe(option)
+        if not value:
+            return []
+        return sorted(set(item.strip().lower() for item in str(value).split(",") if item.strip()))
+
+    def _pruning_flags(self):
+        """ (configure flag, CMake definition) pairs for disabled_protocols and disabled_features """
+        return [self._prunable_protocols[value] for value in self._option_list("disabled_protocols")] + \
+               [self._prunable_features[value] for value in self._option_list("disabled_features")]
 
     def config_options(self):
         if self.settings.os != "Macos":
@@ -112,10 +286,19 @@ class LibcurlConan(ConanFile):
 
         if self.settings.os == "Windows":
             self.options.remove("fPIC")
+            # DLL exports are explicit on Windows
+            self.options.remove("symbol_hiding")
 
         if self.settings.os != "Linux":
             self.options.remove("with_largefile")
 
+        if self.settings.os not in ["Linux", "Macos"]:
+            self.options.remove("build_system")
+
+    def build_requirements(self):
+        if self.use_cmake and self.settings.compiler != "Visual Studio":
+            self.build_requires("ninja/1.9.0")
+
     def requirements(self):
         if self.options.with_openssl:
             if self.settings.os == "Macos" and self.options.darwin_ssl:
@@ -124,33 +307,208 @@ class LibcurlConan(ConanFile):
                 pass
             else:
                 self.requires.add("openssl/1.1.1d")
+        if self.options.with_mbedtls:
+            self.requires.add("mbedtls/2.16.3-apache")
+        if self.options.with_wolfssl:
+            self.requires.add("wolfssl/4.4.0")
         if self.options.with_libssh2:
             if self.settings.compiler != "Visual Studio":
                 self.requires.add("libssh2/1.8.2")
         if self.options.with_nghttp2:
             self.requires.add("libnghttp2/1.39.2")
+        if self.options.with_c_ares:
+            self.requires.add("c-ares/1.15.0")
+        if self.options.with_brotli:
+            self.requires.add("brotli/1.0.7")
 
         self.requires.add("zlib/1.2.11")
 
     def source(self):
-        source_url = "https://curl.haxx.se/download/"
-        sha256 = "d0393da38ac74ffac67313072d7fe75b1fa1010eb5987f63f349b024a36b7ffb"
-        tools.get("{}curl-{}.tar.gz".format(source_url, self.version), sha256=sha256)
+        tarball = "curl-%s.tar.gz" % self.version
+        self._fetch_source(tarball, "https://curl.haxx.se/download/" + tarball,
+                           sha256="d0393da38ac74ffac67313072d7fe75b1fa1010eb5987f63f349b024a36b7ffb")
+        tools.unzip(tarball)
+        os.remove(tarball)
         os.rename("curl-%s" % self.version, self._source_subfolder)
-        tools.download("https://curl.haxx.se/ca/cacert.pem", "cacert.pem", verify=True)
+        local_bundle = os.getenv("LIBCURL_CACERT_PEM")
+        if local_bundle:
+            # offline builds supply their own bundle instead of downloading the current one
+            self.output.info("Using CA bundle %s" % local_bundle)
+            shutil.copy(local_bundle, "cacert.pem")
+        else:
+            self._fetch_source("cacert.pem", "https://curl.haxx.se/ca/cacert.pem",
+                               sha256_url="https://curl.haxx.se/ca/cacert.pem.sha256")
+
+    def _fetch_source(self, filename, url, sha256=None, sha256_url=None):
+        """ Fetches filename from LIBCURL_SOURCE_CACHE, then LIBCURL_SOURCE_MIRROR (both sha256/<digest>), then url """
+        cache_dir = os.getenv("LIBCURL_SOURCE_CACHE")
+        mirror = os.getenv("LIBCURL_SOURCE_MIRROR")
+        # files without a pinned digest keep the one recorded when they entered the cache
+        name_record = os.path.join(cache_dir, "names", filename) if cache_dir else None
+        if not sha256 and name_record and os.path.isfile(name_record):
+            sha256 = tools.load(name_record).strip()
+        if not sha256 and sha256_url:
+            sha256 = self._published_sha256(filename, sha256_url)
+
+        candidates = []
+        if cache_dir:
+            if sha256:
+                candidates.append(os.path.join(cache_dir, "sha256", sha256))
+            candidates.append(os.path.join(cache_dir, filename))
+        if mirror:
+            if sha256:
+                candidates.append("%s/sha256/%s" % (mirror.rstrip("/"), sha256))
+            candidates.append("%s/%s" % (mirror.rstrip("/"), filename))
+        candidates.append(url)
+
+        for candidate in candidates:
+            if candidate.startswith("file://"):
+                candidate = url2pathname(urlparse(candidate).path)
+            try:
+                if "://" in candidate:
+                    tools.download(candidate, filename, verify=True, overwrite=True)
+                elif os.path.isfile(candidate):
+                    shutil.copy(candidate, filename)
+                else:
+                    continue
+            except ConanException as e:
+                self.output.warn("Could not fetch %s from %s: %s" % (filename, candidate, e))
+                continue
+            digest = tools.sha256sum(filename)
+            if sha256 and digest != sha256:
+                self.output.warn("Ignoring %s from %s, sha256 %s does not match %s"
+                                 % (filename, candidate, digest, sha256))
+                os.remove(filename)
+                continue
+            self.output.info("Fetched %s from %s" % (filename, candidate))
+            break
+        else:
+            raise ConanException("Could not fetch %s from any of: %s" % (filename, ", ".join(candidates)))
+
+        if cache_dir:
+            blob = os.path.join(cache_dir, "sha256", digest)
+            if not os.path.isfile(blob):
+                tools.mkdir(os.path.dirname(blob))
+                self._publish(filename, blob)
+            tools.save(name_record, digest)
+
+    def _published_sha256(self, filename, sha256_url):
+        """ Digest of filename from a sha256sum style file published next to it upstream """
+        digest_file = filename + ".sha256"
+        try:
+            tools.download(sha256_url, digest_file, verify=True, overwrite=True)
+            return tools.load(digest_file).split()[0].lower()
+        except (ConanException, IndexError) as e:
+            # offline builds can still use the mirror, but nothing vouches for the copy they get
+            self.output.warn("Could not fetch %s, %s is not verified: %s" % (sha256_url, filename, e))
+            return None
+        finally:
+            if os.path.isfile(digest_file):
+                os.remove(digest_file)
+
+    def _publish(self, source, destination):
+        # publish atomically, parallel builds may share the same cache
+        temp_file = "%s.%d.tmp" % (destination, os.getpid())
+        shutil.copy(source, temp_file)
+        os.replace(temp_file, destination)
 
     def build(self):
-        self.patch_misc_files()
-        if self.settings.compiler != "Visual Studio":
-            self.build_with_autotools()
+        if os.path.isfile(self._build_profile_path):
+            os.remove(self._build_profile_path)
+        with self._build_phase("patch"):
+            self.patch_misc_files()
+        # with pgo, the first build is instrumented and rebuilt after the training run
+        self._pgo_generate = bool(self.options.pgo)
+        with tools.environment_append(self._compiler_launcher_env()):
+            if self.use_cmake:
+                self.build_with_cmake()
+            else:
+                self.build_with_autotools()
+
+    @property
+    def _build_profile_path(self):
+        return os.path.join(self.build_folder, "build_profile.json")
+
+    @contextmanager
+    def _build_phase(self, name):
+        """ Records wall time, CPU time (children included) and peak child RSS of a build phase """
+        start_wall = time.time()
+        start_cpu = sum(os.times()[:4])
+        start_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss if resource else None
+        start_cache = self._compiler_cache_stats()
+        yield
+        phase = {"phase": name,
+                 "wall_seconds": round(time.time() - start_wall, 3),
+                 "cpu_seconds": round(sum(os.times()[:4]) - start_cpu, 3),
+                 "peak_rss_kb": None}
+        if resource:
+            # ru_maxrss is the largest child of the whole build so far, it only belongs to this phase if it grew
+            peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+            if peak_rss > start_rss:
+                phase["peak_rss_kb"] = peak_rss // 1024 if sys.platform == "darwin" else peak_rss
+        end_cache = self._compiler_cache_stats()
+        if start_cache and end_cache:
+            hits, misses = end_cache[0] - start_cache[0], end_cache[1] - start_cache[1]
+            if hits + misses:
+                phase["compiler_cache"] = {"hits": hits, "misses": misses,
+                                           "hit_rate": round(float(hits) / (hits + misses), 3)}
+                self.output.info("%s: %s hit rate %.1f%% (%d hits, %d misses)"
+                                 % (name, self.options.compiler_launcher, 100.0 * hits / (hits + misses),
+                                    hits, misses))
+
+        if os.path.isfile(self._build_profile_path):
+            profile = json.loads(tools.load(self._build_profile_path))
         else:
-            self.build_with_cmake()
+            profile = {"reference": "%s/%s" % (self.name, self.version),
+                       "settings": dict(self.settings.values_list),
+                       "options": dict(self.options.values.as_list()),
+                       "phases": []}
+        profile["phases"].append(phase)
+        tools.save(self._build_profile_path, json.dumps(profile, indent=4))
+
+    def _compiler_cache_stats(self):
+        """ (hits, misses) of the compiler_launcher cache so far, global to the cache, or None """
+        launcher = self.options.get_safe("compiler_launcher")
+        if not launcher:
+            return None
+        try:
+            if launcher == "ccache":
+                output = subprocess.check_output(["ccache", "--print-stats"]).decode()
+                stats = dict(line.split("\t", 1) for line in output.splitlines() if "\t" in line)
+                hits = int(stats.get("direct_cache_hit", 0)) + int(stats.get("preprocessed_cache_hit", 0))
+                return hits, int(stats.get("cache_miss", 0))
+            output = subprocess.check_output(["sccache", "--show-stats", "--stats-format", "json"]).decode()
+            stats = json.loads(output)["stats"]
+            return sum(stats["cache_hits"]["counts"].values()), sum(stats["cache_misses"]["counts"].values())
+        except (OSError, subprocess.CalledProcessError, ValueError, KeyError):
+            return None
+
+    def _compiler_launcher(self):
+        launcher = self.options.get_safe("compiler_launcher")
+        if not launcher:
+            return None
+        program = tools.which(str(launcher))
+        if not program:
+            raise ConanException("compiler_launcher %s was not found in PATH" % launcher)
+        return program
+
+    def _compiler_launcher_env(self):
+        if self.options.get_safe("compiler_launcher") != "ccache":
+            return {}
+        # hash paths relative to the folder holding this build and its dependencies, so every package id of the
+        # matrix, each built in its own folder, hits the same cache entries
+        folders = [self.build_folder] + [self.deps_cpp_info[name].rootpath for name in self.deps_cpp_info.deps]
+        return {"CCACHE_BASEDIR": os.path.commonpath(folders), "CCACHE_NOHASHDIR": "1"}
 
     def patch_misc_files(self):
-        if self.options.with_largemaxwritesize:
+        if self.options.max_write_size:
             tools.replace_in_file(os.path.join(self._source_subfolder, 'include', 'curl', 'curl.h'),
                                   "define CURL_MAX_WRITE_SIZE 16384",
-                                  "define CURL_MAX_WRITE_SIZE 10485760")
+                                  "define CURL_MAX_WRITE_SIZE %d" % int(str(self.options.max_write_size)))
+        if self.options.max_http_header:
+            tools.replace_in_file(os.path.join(self._source_subfolder, 'include', 'curl', 'curl.h'),
+                                  "define CURL_MAX_HTTP_HEADER (100*1024)",
+                                  "define CURL_MAX_HTTP_HEADER %d" % int(str(self.options.max_http_header)))
 
         # https://github.com/curl/curl/issues/2835
         if self.settings.compiler == 'apple-clang' and self.settings.compiler.version == '9.1':
@@ -165,10 +523,16 @@ class LibcurlConan(ConanFile):
         params.append("--without-librtmp" if not self.options.with_librtmp else "--with-librtmp")
         params.append("--without-libmetalink" if not self.options.with_libmetalink else "--with-libmetalink")
         params.append("--without-libpsl" if not self.options.with_libpsl else "--with-libpsl")
-        params.append("--without-brotli" if not self.options.with_brotli else "--with-brotli")
+        if self.options.with_brotli:
+            params.append("--with-brotli=%s" % self.deps_cpp_info["brotli"].rootpath.replace('\\', '/'))
+        else:
+            params.append("--without-brotli")
 
         if self.settings.build_type == 'Debug':
             params.append("--enable-debug")
+        if self.options.memory_tracking:
+            # CURLDEBUG: allocations, sockets and FILEs are logged to the file given to curl_dbg_memdebug()
+            params.append("--enable-curldebug")
 
         if not self.options.get_safe("with_largefile"):
             params.append("--disable-largefile")
@@ -179,6 +543,12 @@ class LibcurlConan(ConanFile):
         elif self.settings.os == "Windows" and self.options.with_winssl:
             params.append("--with-winssl")
             params.append("--without-ssl")
+        elif self.options.with_mbedtls:
+            params.append("--with-mbedtls=%s" % self.deps_cpp_info["mbedtls"].rootpath.replace('\\', '/'))
+            params.append("--without-ssl")
+        elif self.options.with_wolfssl:
+            params.append("--with-wolfssl=%s" % self.deps_cpp_info["wolfssl"].rootpath.replace('\\', '/'))
+            params.append("--without-ssl")
         elif self.options.with_openssl:
             openssl_path = self.deps_cpp_info["openssl"].rootpath.replace('\\', '/')
             params.append("--with-ssl=%s" % openssl_path)
@@ -204,21 +574,36 @@ class LibcurlConan(ConanFile):
             params.append("--enable-shared")
             params.append("--disable-static")
 
+        if self.options.with_c_ares:
+            # c-ares and the threaded resolver are mutually exclusive
+            params.append("--enable-ares=%s" % self.deps_cpp_info["c-ares"].rootpath.replace('\\', '/'))
+            params.append("--disable-threaded-resolver")
+        else:
+            params.append("--disable-ares")
+
         if self.options.disable_threads:
             params.append("--disable-thread")
 
         if not self.options.with_ldap:
             params.append("--disable-ldap")
 
-        if self.options.with_ca_bundle == False:
+        params.extend(configure_flag for configure_flag, _ in self._pruning_flags())
+
+        if self.options.get_safe("symbol_hiding"):
+            params.append("--enable-symbol-hiding")
+        elif self.options.shared and self.settings.os != "Windows":
+            params.append("--disable-symbol-hiding")
+
+        ca_bundle, ca_path = self._ca_defaults()
+        if ca_bundle == False:
             params.append("--without-ca-bundle")
-        elif self.options.with_ca_bundle:
-            params.append("--with-ca-bundle=" + str(self.options.with_ca_bundle))
+        elif ca_bundle:
+            params.append("--with-ca-bundle=" + str(ca_bundle))
 
-        if self.options.with_ca_path == False:
+        if ca_path == False:
             params.append('--without-ca-path')
-        elif self.options.with_ca_path:
-            params.append("--with-ca-path=" + str(self.options.with_ca_path))
+        elif ca_path:
+            params.append("--with-ca-path=" + str(ca_path))
 
         host = None
         # Cross building flags
@@ -227,6 +612,17 @@ class LibcurlConan(ConanFile):
 
         return params, host
 
+    def _ca_defaults(self):
+        """ with_ca_bundle and with_ca_path, the packaged hashed directory by default with ca_hashed_dir """
+        # OpenSSL parses a whole bundle for every handle, the hashed directory is loaded on demand
+        ca_bundle = self.options.with_ca_bundle
+        ca_path = self.options.with_ca_path
+        if self.options.ca_hashed_dir and not ca_path:
+            ca_path = os.path.join(self.package_folder, self._ca_subfolder).replace('\\', '/')
+            if not ca_bundle:
+                ca_bundle = False
+        return ca_bundle, ca_path
+
     def get_host(self):
         arch = None
         if self.settings.os == 'Linux':
@@ -258,8 +654,9 @@ class LibcurlConan(ConanFile):
         return version
 
     def patch_mingw_files(self):
+        """ Returns True if Makefile.am / configure.ac were patched and autoreconf is required """
         if not self.is_mingw:
-            return
+            return False
         # patch autotools files
         # for mingw builds - do not compile curl tool, just library
         # linking errors are much harder to fix than to exclude curl tool
@@ -294,6 +691,7 @@ class LibcurlConan(ConanFile):
             if not tools.cross_building(self.settings):
                 added_content = tools.load(os.path.join(self.source_folder, 'lib_Makefile_add.am'))
                 tools.save(os.path.join('lib', 'Makefile.am'), added_content, append=True)
+        return True
 
     def build_with_autotools(self):
         env_run = RunEnvironment(self)
@@ -304,15 +702,62 @@ class LibcurlConan(ConanFile):
             with tools.chdir(self._source_subfolder):
                 use_win_bash = self.is_mingw and not tools.cross_building(self.settings)
 
-                # autoreconf
-                self.run('./buildconf', win_bash=use_win_bash)
+                # the release tarball ships a generated configure,
+                # autoreconf is only needed once the autotools inputs are patched
+                with self._build_phase("patch"):
+                    patched = self.patch_mingw_files()
+                if patched:
+                    with self._build_phase("buildconf"):
+                        self.run('./buildconf', win_bash=use_win_bash)
 
                 tools.replace_in_file("configure", "-install_name \\$rpath/", "-install_name ")
                 self.run("chmod +x configure")
 
-                autotools, autotools_vars = self._configure_autotools()
+                with self._build_phase("configure"):
+                    autotools, autotools_vars = self._configure_autotools()
+
+                with self._build_phase("make"):
+                    autotools.make(vars=autotools_vars)
+
+                if self._pgo_generate:
+                    with self._build_phase("pgo_training"):
+                        self._train_pgo()
+                    autotools.make(target="clean", vars=autotools_vars)
+                    self._pgo_generate = False
+                    self._autotools = False
+                    with self._build_phase("configure"):
+                        autotools, autotools_vars = self._configure_autotools()
+                    with self._build_phase("make"):
+                        autotools.make(vars=autotools_vars)
+
+                shutil.rmtree(self._staging_folder, ignore_errors=True)
+                destdir = tools.unix_path(self._staging_folder) if use_win_bash else self._staging_folder
+                with self._build_phase("install"):
+                    autotools.install(args=["DESTDIR=%s" % destdir], vars=autotools_vars)
+                self._save_staged_prefix()
 
-                autotools.make(vars=autotools_vars)
+    @property
+    def _staging_folder(self):
+        return os.path.join(self.build_folder, "staging")
+
+    @property
+    def _staged_prefix_file(self):
+        return os.path.join(self.build_folder, "staged_prefix.txt")
+
+    def _save_staged_prefix(self):
+        """ Records the prefix of the DESTDIR install, package() may run with another package folder """
+        # CMake drops the drive letter of the prefix, the msys make of native mingw builds sees /c/... paths
+        prefix = self.package_folder
+        if self.is_mingw and not self.use_cmake and not tools.cross_building(self.settings):
+            prefix = tools.unix_path(prefix)
+        tools.save(self._staged_prefix_file, os.path.splitdrive(prefix)[1].lstrip("\\/"))
+
+    def _load_staged_prefix(self):
+        if os.path.isfile(self._staged_prefix_file):
+            staged_prefix = os.path.join(self._staging_folder, tools.load(self._staged_prefix_file).strip())
+            if os.path.isdir(staged_prefix):
+                return staged_prefix
+        raise ConanException("No staged install in %s, run the build step first" % self._staging_folder)
 
     def _configure_autotools_vars(self):
         autotools_vars = self._autotools.vars
@@ -326,8 +771,40 @@ class LibcurlConan(ConanFile):
 
             del autotools_vars['LIBS']
             self.output.info("Autotools env vars: " + repr(autotools_vars))
+        autotools_vars.update(self._lto_tools())
+        launcher = self._compiler_launcher()
+        compiler = os.getenv("CC")
+        if not compiler and not tools.cross_building(self.settings):
+            compiler = "gcc" if self.settings.compiler == "gcc" else "clang"
+        if launcher and compiler:
+            autotools_vars["CC"] = "%s %s" % (launcher, compiler)
+        elif launcher:
+            # configure picks <host>-gcc by itself, wrapping a guessed name would replace the cross compiler
+            self.output.warn("compiler_launcher is not used, set CC to the cross compiler to enable it")
         return autotools_vars
 
+    def _configure_cache_files(self, host):
+        """ Shared and private autoconf cache file paths, or None when LIBCURL_CONFIGURE_CACHE_DIR is not set """
+        cache_dir = os.getenv("LIBCURL_CONFIGURE_CACHE_DIR")
+        if not cache_dir:
+            return None
+        # shared by every configuration built with the same toolchain, e.g. a whole build.py matrix per compiler
+        key = repr([host, str(self.settings.os), str(self.settings.arch), str(self.settings.compiler),
+                    str(self.settings.compiler.version)])
+        shared_cache = os.path.join(cache_dir, "config-%s.cache" % hashlib.sha1(key.encode()).hexdigest())
+        local_cache = os.path.abspath("config.cache")
+        if os.path.isfile(shared_cache):
+            self.output.info("Using configure cache %s" % shared_cache)
+            lines = tools.load(shared_cache).splitlines(True)
+            tools.save(local_cache, "".join(line for line in lines
+                                            if not self._configuration_cache_entries.match(line)))
+        else:
+            # a cache of an earlier configure run (e.g. the instrumented pgo build) has other precious variables
+            if os.path.isfile(local_cache):
+                os.remove(local_cache)
+            tools.mkdir(cache_dir)
+        return shared_cache, local_cache
+
     def _configure_autotools(self):
         if not self._autotools:
             use_win_bash = self.is_mingw and not tools.cross_building(self.settings)
@@ -336,73 +813,236 @@ class LibcurlConan(ConanFile):
             if self.settings.os != "Windows":
                 self._autotools.fpic = self.options.fPIC
 
+            optimization_flags = self._lto_flags() + self._pgo_flags()
+            self._autotools.flags.extend(optimization_flags + self._profiling_flags() + self._section_flags())
+            self._autotools.link_flags.extend(optimization_flags)
+            if self.options.shared:
+                self._autotools.link_flags.extend(self._gc_sections_link_flags())
+
             autotools_vars = self._configure_autotools_vars()
 
             # tweaks for mingw
             if self.is_mingw:
-                # patch autotools files
-                self.patch_mingw_files()
-
                 self._autotools.defines.append('_AMD64_')
 
             configure_args, host = self.get_configure_command_args()
+            cache_files = self._configure_cache_files(host)
+            if cache_files:
+                shared_cache, local_cache = cache_files
+                cache_path = tools.unix_path(local_cache) if use_win_bash else local_cache
+                configure_args.append("--cache-file=%s" % cache_path)
             self._autotools.configure(vars=autotools_vars, args=configure_args, host=host)
+            if cache_files:
+                self._publish(local_cache, shared_cache)
 
         return self._autotools, self._configure_autotools_vars()
 
+    @property
+    def _pgo_folder(self):
+        return os.path.join(self.build_folder, "pgo_data")
+
+    def _lto_flags(self):
+        if not self.options.lto or self.settings.compiler == "Visual Studio":
+            return []
+        if self.settings.compiler == "gcc" and not self.options.shared:
+            # keep regular object code in the archive, so consumers linking without -flto still work
+            return ["-flto", "-ffat-lto-objects"]
+        return ["-flto"]
+
+    def _lto_tools(self):
+        # static archives of LTO objects need the plugin-aware binutils wrappers
+        if not self.options.lto or self.options.shared:
+            return {}
+        if self.settings.compiler == "gcc":
+            return {"AR": "gcc-ar", "RANLIB": "gcc-ranlib", "NM": "gcc-nm"}
+        if self.settings.compiler == "clang":
+            return {"AR": "llvm-ar", "RANLIB": "llvm-ranlib", "NM": "llvm-nm"}
+        return {}
+
+    def _profiling_flags(self):
+        if not self.options.profiling:
+            return []
+        # without --enable-debug curl's configure strips -g, -g2, -ggdb... from CFLAGS, but not -gdwarf-4
+        return ["-gdwarf-4", "-fno-omit-frame-pointer"]
+
+    def _section_flags(self):
+        if not self.options.gc_sections:
+            return []
+        # one section per function and object, so the linker can drop the unreferenced ones
+        return ["-ffunction-sections", "-fdata-sections"]
+
+    def _gc_sections_link_flags(self):
+        if not self.options.gc_sections:
+            return []
+        if self.settings.os in ["Macos", "iOS"]:
+            return ["-Wl,-dead_strip"]
+        return ["-Wl,--gc-sections"]
+
+    def _pgo_flags(self):
+        if not self.options.pgo:
+            return []
+        if self._pgo_generate:
+            return ["-fprofile-generate=%s" % self._pgo_folder]
+        if self.settings.compiler == "gcc":
+            return ["-fprofile-use=%s" % self._pgo_folder, "-fprofile-correction"]
+        return ["-fprofile-use=%s" % os.path.join(self._pgo_folder, "curl.profdata")]
+
+    def _train_pgo(self):
+        candidates = [os.path.join(self.build_folder, self._source_subfolder, "src", "curl"),
+                      os.path.join(self.build_folder, self._build_subfolder, "bin", "curl"),
+                      os.path.join(self.build_folder, self._build_subfolder, "src", "curl")]
+        curl_exe = next(path for path in candidates if os.path.isfile(path))
+        self.output.info("Running PGO training workload %s with %s" % (pgo_training.WORKLOAD, curl_exe))
+        with tools.environment_append(RunEnvironment(self).vars):
+            pgo_training.run_workload(curl_exe)
+
+        if self.settings.compiler == "gcc":
+            profile_files = glob.glob(os.path.join(self._pgo_folder, "*.gcda"))
+        else:
+            profdata = "llvm-profdata" if self.settings.compiler == "clang" else "xcrun llvm-profdata"
+            raw_files = glob.glob(os.path.join(self._pgo_folder, "*.profraw"))
+            self.run("%s merge -output=%s %s" % (profdata, os.path.join(self._pgo_folder, "curl.profdata"),
+                                                " ".join(raw_files)))
+            profile_files = [os.path.join(self._pgo_folder, "curl.profdata")]
+
+        # recorded in the package, so it is known which profile the binaries were optimized with
+        profile = {"workload": pgo_training.WORKLOAD,
+                   "compiler": "%s %s" % (self.settings.compiler, self.settings.compiler.version),
+                   "files": {os.path.basename(path): hashlib.sha256(tools.load(path, binary=True)).hexdigest()
+                             for path in sorted(profile_files)}}
+        tools.save(os.path.join(self.build_folder, "pgo_profile.json"), json.dumps(profile, indent=4))
+
     def _configure_cmake(self):
-        cmake = CMake(self)
+        generator = "Ninja" if self.settings.compiler != "Visual Studio" else None
+        cmake = CMake(self, generator=generator)
         cmake.definitions['BUILD_TESTING'] = False
-        cmake.definitions['BUILD_CURL_EXE'] = False
+        # the curl tool drives the pgo training workload
+        cmake.definitions['BUILD_CURL_EXE'] = self.options.pgo
         cmake.definitions['CURL_DISABLE_LDAP'] = not self.options.with_ldap
+        cmake.definitions['ENABLE_CURLDEBUG'] = self.options.memory_tracking
+        for _, definition in self._pruning_flags():
+            cmake.definitions[definition] = True
         cmake.definitions['BUILD_SHARED_LIBS'] = self.options.shared
         cmake.definitions['CURL_STATICLIB'] = not self.options.shared
         cmake.definitions['CMAKE_DEBUG_POSTFIX'] = ''
+        launcher = self._compiler_launcher()
+        if launcher:
+            cmake.definitions['CMAKE_C_COMPILER_LAUNCHER'] = launcher
+        if self.settings.os == "Macos":
+            # plain install_name, matching the -install_name patch of the autotools build
+            cmake.definitions['CMAKE_MACOSX_RPATH'] = False
+        if self.options.get_safe("symbol_hiding"):
+            cmake.definitions['CURL_HIDDEN_SYMBOLS'] = True
         cmake.definitions['CMAKE_USE_LIBSSH2'] = self.options.with_libssh2
-        if self.options.with_ca_bundle == False:
+        cmake.definitions['ENABLE_ARES'] = self.options.with_c_ares
+        cmake.definitions['ENABLE_THREADED_RESOLVER'] = not (self.options.with_c_ares or self.options.disable_threads)
+        cmake.definitions['USE_NGHTTP2'] = self.options.with_nghttp2
+        cmake.definitions['CURL_BROTLI'] = self.options.with_brotli
+        if not self.options.with_libidn:
+            # libidn2 is auto-detected, pre-seed the check so it is never picked up from the system
+            cmake.definitions['HAVE_LIBIDN2'] = False
+        # point the upstream find modules at the conan library names, which may differ (e.g. static suffixes)
+        for option, dependency, variables in [("with_libssh2", "libssh2", {"LIBSSH2_LIBRARY": "ssh2"}),
+                                              ("with_nghttp2", "libnghttp2", {"NGHTTP2_LIBRARY": "nghttp2"}),
+                                              ("with_c_ares", "c-ares", {"CARES_LIBRARY": "cares"}),
+                                              ("with_mbedtls", "mbedtls", {"MBEDTLS_LIBRARY": "mbedtls",
+                                                                           "MBEDX509_LIBRARY": "mbedx509",
+                                                                           "MBEDCRYPTO_LIBRARY": "mbedcrypto"}),
+                                              ("with_brotli", "brotli", {"BROTLIDEC_LIBRARY": "brotlidec",
+                                                                         "BROTLICOMMON_LIBRARY": "brotlicommon"})]:
+            if self.options.get_safe(option) and dependency in self.deps_cpp_info.deps:
+                libs = self.deps_cpp_info[dependency].libs
+                for variable, name in variables.items():
+                    cmake.definitions[variable] = next((lib for lib in libs if lib.startswith(name)), name)
+
+        ca_bundle, ca_path = self._ca_defaults()
+        if ca_bundle == False:
             cmake.definitions['CURL_CA_BUNDLE'] = 'none'
-        elif self.options.with_ca_bundle:
-            cmake.definitions['CURL_CA_BUNDLE'] = self.options.with_ca_bundle
-        if self.options.with_ca_path == False:
+        elif ca_bundle:
+            cmake.definitions['CURL_CA_BUNDLE'] = ca_bundle
+        if ca_path == False:
             cmake.definitions['CURL_CA_PATH'] = 'none'
-        elif self.options.with_ca_path:
-            cmake.definitions['CURL_CA_PATH'] = self.options.with_ca_path
+        elif ca_path:
+            cmake.definitions['CURL_CA_PATH'] = ca_path
 
         # all these options are exclusive. set just one of them
-        # mac builds do not use cmake so don't even bother about darwin_ssl
+        # darwin_ssl takes precedence over with_openssl, as in get_configure_command_args
+        use_darwinssl = self.settings.os == "Macos" and self.options.darwin_ssl
+        cmake.definitions['CMAKE_USE_SECTRANSP'] = use_darwinssl
         cmake.definitions['CMAKE_USE_WINSSL'] = 'with_winssl' in self.options and self.options.with_winssl
-        cmake.definitions['CMAKE_USE_OPENSSL'] = 'with_openssl' in self.options and self.options.with_openssl
+        cmake.definitions['CMAKE_USE_MBEDTLS'] = self.options.with_mbedtls
+        cmake.definitions['CMAKE_USE_OPENSSL'] = 'with_openssl' in self.options and self.options.with_openssl and \
+            not use_darwinssl
+        if self.options.lto:
+            if self.settings.compiler == "Visual Studio":
+                cmake.definitions['CMAKE_POLICY_DEFAULT_CMP0069'] = 'NEW'
+                cmake.definitions['CMAKE_INTERPROCEDURAL_OPTIMIZATION'] = True
+            for tool, program in self._lto_tools().items():
+                cmake.definitions['CMAKE_%s' % tool] = program
+        optimization_flags = self._lto_flags() + self._pgo_flags()
+        c_flags = optimization_flags + self._profiling_flags() + self._section_flags()
+        if self.options.get_safe("with_largefile"):
+            # what AC_SYS_LARGEFILE defines for the autotools build
+            c_flags.append("-D_FILE_OFFSET_BITS=64")
+        # an explicit CMAKE_<LANG>_FLAGS replaces what CMake takes from CFLAGS / LDFLAGS, so keep those in front
+        if c_flags:
+            cmake.definitions['CMAKE_C_FLAGS'] = " ".join([os.getenv("CFLAGS", "")] + c_flags).strip()
+        if optimization_flags:
+            cmake.definitions['CMAKE_EXE_LINKER_FLAGS'] = \
+                " ".join([os.getenv("LDFLAGS", "")] + optimization_flags).strip()
+        shared_link_flags = optimization_flags + self._gc_sections_link_flags()
+        if shared_link_flags:
+            cmake.definitions['CMAKE_SHARED_LINKER_FLAGS'] = \
+                " ".join([os.getenv("LDFLAGS", "")] + shared_link_flags).strip()
         cmake.configure(build_folder=self._build_subfolder)
         return cmake
 
     def build_with_cmake(self):
         # patch cmake files
-        with tools.chdir(self._source_subfolder):
-            tools.replace_in_file("CMakeLists.txt",
-                                  "include(CurlSymbolHiding)",
-                                  "")
+        # on MSVC CurlSymbolHiding would turn on CMAKE_WINDOWS_EXPORT_ALL_SYMBOLS
+        if not self.options.get_safe("symbol_hiding"):
+            with tools.chdir(self._source_subfolder):
+                tools.replace_in_file("CMakeLists.txt",
+                                      "include(CurlSymbolHiding)",
+                                      "")
 
-        cmake = self._configure_cmake()
-        cmake.build()
+        with self._build_phase("configure"):
+            cmake = self._configure_cmake()
+        with self._build_phase("build"):
+            cmake.build()
+
+        if self._pgo_generate:
+            with self._build_phase("pgo_training"):
+                self._train_pgo()
+            self._pgo_generate = False
+            with self._build_phase("configure"):
+                cmake = self._configure_cmake()
+            with self._build_phase("build"):
+                cmake.build()
+
+        shutil.rmtree(self._staging_folder, ignore_errors=True)
+        with self._build_phase("install"):
+            with tools.environment_append({"DESTDIR": self._staging_folder}):
+                cmake.install()
+        self._save_staged_prefix()
 
     def package(self):
         self.copy(pattern="COPYING*", dst="licenses", src=self._source_subfolder, ignore_case=True, keep_path=False)
         self.copy(pattern="LICENSE", dst="licenses", src=self._source_subfolder)
 
-        # Execute install
-        if self.settings.compiler != "Visual Studio":
-            env_run = RunEnvironment(self)
+        # build() already installed into the staging folder, packaging is a plain copy
+        with self._build_phase("package_copy"):
+            self.copy("*", src=self._load_staged_prefix(), symlinks=True)
 
-            with tools.environment_append(env_run.vars):
-                with tools.chdir(self._source_subfolder):
-                    autotools, autotools_vars = self._configure_autotools()
-                    autotools.install(vars=autotools_vars)
-        else:
-            cmake = self._configure_cmake()
-            cmake.install()
+        if self.options.profiling and self.options.shared:
+            self._split_debug_info()
 
         # Copy the certs to be used by client
         self.copy("cacert.pem", keep_path=False)
+        if self.options.ca_hashed_dir:
+            self._package_ca_dir()
+        self.copy("pgo_profile.json", keep_path=False)
+        self.copy("build_profile.json", keep_path=False)
 
         if self.settings.os == "Windows" and self.settings.compiler != "Visual Studio":
             # Handle only mingw libs
@@ -411,6 +1051,8 @@ class LibcurlConan(ConanFile):
             self.copy(pattern="*.def", dst="lib", keep_path=False)
             self.copy(pattern="*.lib", dst="lib", keep_path=False)
 
+        # conan generates its own find modules
+        shutil.rmtree(os.path.join(self.package_folder, 'lib', 'cmake'), ignore_errors=True)
         # no need to distribute docs/man pages
         shutil.rmtree(os.path.join(self.package_folder, 'share', 'man'), ignore_errors=True)
         # no need for bin tools
@@ -418,8 +1060,105 @@ class LibcurlConan(ConanFile):
             if os.path.isfile(os.path.join(self.package_folder, 'bin', binname)):
                 os.remove(os.path.join(self.package_folder, 'bin', binname))
 
+        tools.save(os.path.join(self.package_folder, self._manifest_file),
+                   json.dumps(self._feature_manifest(), indent=4, sort_keys=True))
+
+    def _feature_manifest(self):
+        """ Options, protocols, features, TLS backends, dependencies and build flags, read from curl-config """
+        curl_config_path = os.path.join(self.package_folder, "bin", "curl-config")
+        if not os.path.isfile(curl_config_path):
+            raise ConanException("%s is missing, cannot write the feature manifest" % curl_config_path)
+        curl_config = tools.load(curl_config_path)
+
+        def curl_config_value(pattern):
+            match = re.search(pattern, curl_config)
+            return match.group(1).strip() if match else ""
+
+        manifest = {"reference": "%s/%s" % (self.name, self.version),
+                    "settings": dict(self.settings.values_list),
+                    "options": dict(self.options.values.as_list()),
+                    "protocols": sorted(protocol.lower() for protocol in
+                                        curl_config_value(r"for protocol in (.*?); do").split()),
+                    "features": sorted(feature for feature in
+                                       curl_config_value(r"for feature in (.*?); do").split() if feature != '""'),
+                    "ssl_backends": [backend.strip() for backend in
+                                     curl_config_value(r'--ssl-backends\)\s*echo "(.*?)"').split(",")
+                                     if backend.strip()],
+                    # deps_cpp_info also lists the build requirements (ninja, mingw, msys2)
+                    "dependencies": {name: self.deps_cpp_info[name].version for name in self.deps_cpp_info.deps
+                                     if name in self.requires},
+                    "build_system": "cmake" if self.use_cmake else "autotools",
+                    "flags": {}}
+        if self.use_cmake:
+            cache_path = os.path.join(self.build_folder, self._build_subfolder, "CMakeCache.txt")
+            for line in tools.load(cache_path).splitlines():
+                match = re.match(r"^(CMAKE_C_FLAGS\w*|CMAKE_\w+_LINKER_FLAGS|CMAKE_C_COMPILER\w*|CMAKE_BUILD_TYPE|"
+                                 r"CMAKE_GENERATOR|CMAKE_UNITY_BUILD|CMAKE_INTERPROCEDURAL_OPTIMIZATION):\w+=(.*)$",
+                                 line)
+                if match and match.group(2):
+                    manifest["flags"][match.group(1)] = match.group(2)
+        else:
+            manifest["flags"]["configure"] = curl_config_value(r"--configure\)\s*echo (.*)").strip('"').strip()
+            manifest["flags"]["cc"] = curl_config_value(r'--cc\)\s*echo "(.*?)"')
+        return manifest
+
+    def _split_debug_info(self):
+        """ Moves the DWARF of the shared library to debug/, static archives keep theirs for the consumer """
+        debug_dir = os.path.join(self.package_folder, self._debug_subfolder)
+        tools.mkdir(debug_dir)
+        lib_dir = os.path.join(self.package_folder, "lib")
+        libraries = [path for path in glob.glob(os.path.join(lib_dir, "libcurl.*"))
+                     if not os.path.islink(path) and not path.endswith((".la", ".a"))]
+        for library in libraries:
+            name = os.path.basename(library)
+            if self.settings.os == "Macos":
+                self.run('dsymutil "%s" -o "%s.dSYM"' % (library, os.path.join(debug_dir, name)))
+                self.run('strip -S "%s"' % library)
+            else:
+                objcopy = os.getenv("OBJCOPY", "objcopy")
+                self.run('%s --only-keep-debug "%s" "%s.debug"' % (objcopy, library, os.path.join(debug_dir, name)))
+                # the debuglink records the file name and CRC, debuggers search it in their debug directories
+                with tools.chdir(debug_dir):
+                    self.run('%s --strip-debug --add-gnu-debuglink="%s.debug" "%s"' % (objcopy, name, library))
+
+    def _openssl_program(self):
+        # the openssl tool of the dependency, unless it cannot run here; subject hashes do not depend on the host
+        if not tools.cross_building(self.settings):
+            for name in ["openssl", "openssl.exe"]:
+                program = os.path.join(self.deps_cpp_info["openssl"].rootpath, "bin", name)
+                if os.path.isfile(program):
+                    return program
+        program = tools.which("openssl")
+        if not program:
+            raise ConanException("ca_hashed_dir needs the openssl command line tool to hash the CA bundle")
+        return program
+
+    def _package_ca_dir(self):
+        """ Splits cacert.pem into <subject hash>.<n> files, like c_rehash, so OpenSSL loads CAs on demand """
+        bundle = tools.load(os.path.join(self.build_folder, "cacert.pem"))
+        certs = re.findall(r"-----BEGIN CERTIFICATE-----.+?-----END CERTIFICATE-----", bundle, re.DOTALL)
+        ca_dir = os.path.join(self.package_folder, self._ca_subfolder)
+        tools.mkdir(ca_dir)
+        openssl = self._openssl_program()
+        cert_path = os.path.join(self.build_folder, "ca_hashed_dir.pem")
+        hashed = {}
+        with tools.environment_append(RunEnvironment(self).vars):
+            for cert in certs:
+                tools.save(cert_path, cert + "\n")
+                subject_hash = subprocess.check_output([openssl, "x509", "-subject_hash", "-noout",
+                                                        "-in", cert_path]).decode().strip()
+                # same subject hash: number the files, skip exact duplicates
+                existing = hashed.setdefault(subject_hash, [])
+                if cert in existing:
+                    continue
+                tools.save(os.path.join(ca_dir, "%s.%d" % (subject_hash, len(existing))), cert + "\n")
+                existing.append(cert)
+        os.remove(cert_path)
+        self.output.info("Hashed %d certificates into %s" % (sum(len(c) for c in hashed.values()), self._ca_subfolder))
+
     def package_info(self):
         if self.settings.compiler != "Visual Studio":
+            # CMake builds name the library libcurl.a / libcurl.so too, same as autotools
             self.cpp_info.libs = ['curl']
             if self.settings.os == "Linux":
                 self.cpp_info.libs.extend(["rt", "pthread"])
@@ -429,15 +1168,13 @@ class LibcurlConan(ConanFile):
                     self.cpp_info.libs.extend(["idn"])
                 if self.options.with_librtmp:
                     self.cpp_info.libs.extend(["rtmp"])
-                if self.options.with_brotli:
-                    self.cpp_info.libs.extend(["brotlidec"])
             if self.settings.os == "Macos":
                 if self.options.with_ldap:
                     self.cpp_info.libs.extend(["ldap"])
                 if self.options.darwin_ssl:
                     self.cpp_info.exelinkflags.append("-framework Cocoa")
                     self.cpp_info.exelinkflags.append("-framework Security")
-                    self.cpp_info.sharedlinkflags = self.cpp_info.exelinkflags
+                    self.cpp_info.sharedlinkflags = list(self.cpp_info.exelinkflags)
         else:
             self.cpp_info.libs = ['libcurl_imp'] if self.options.shared else ['libcurl']
 
@@ -455,5 +1192,29 @@ class LibcurlConan(ConanFile):
             self.cpp_info.exelinkflags.append("-pthread")
             self.cpp_info.sharedlinkflags.append("-pthread")
 
+        # so downstream recipes can pick a variant from deps_user_info without building anything
+        manifest_path = os.path.join(self.package_folder, self._manifest_file)
+        if os.path.isfile(manifest_path):
+            self.user_info.manifest = manifest_path
+            manifest = json.loads(tools.load(manifest_path))
+            self.user_info.protocols = ",".join(manifest["protocols"])
+            self.user_info.features = ",".join(manifest["features"])
+            self.user_info.ssl_backends = ",".join(manifest["ssl_backends"])
+
+        if self.options.profiling and self.options.shared:
+            # the split debug info, for gdb's debug-file-directory or perf's --symfs
+            self.user_info.debug_dir = os.path.join(self.package_folder, self._debug_subfolder)
+
+        if self.options.ca_hashed_dir:
+            # for CURLOPT_CAPATH, the path compiled in is only valid where the package was built
+            self.user_info.ca_path = os.path.join(self.package_folder, self._ca_subfolder)
+
         if not self.options.shared:
             self.cpp_info.defines.append("CURL_STATICLIB=1")
+            # the archive is split into sections, consumers drop what they do not reference at link time
+            self.cpp_info.exelinkflags.extend(self._gc_sections_link_flags())
+            self.cpp_info.sharedlinkflags.extend(self._gc_sections_link_flags())
+            if self.options.lto and self.settings.compiler == "clang":
+                # the archive holds bitcode only, consumers have to link with LTO enabled
+                self.cpp_info.exelinkflags.append("-flto")
+                self.cpp_info.sharedlinkflags.append("-flto")
@@ -0,0 +1,77 @@
+""" Loopback HTTP workload used to train PGO builds of libcurl through the curl tool """
+import gzip
+import os
+import subprocess
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+WORKLOAD = "loopback-http-1"
+
+_PAYLOAD = b"".join(b'{"id": %d, "name": "item-%d", "tags": ["a", "b", "c"]}\n' % (i, i) for i in range(2048))
+
+
+class _TrainingHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _reply(self, body, headers=None):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/gzip") and "gzip" in self.headers.get("Accept-Encoding", ""):
+            self._reply(self.server.compressed, {"Content-Encoding": "gzip"})
+        else:
+            self._reply(_PAYLOAD)
+
+    do_HEAD = do_GET
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        self._reply(b'{"received": %d}' % len(body))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def run_workload(curl_exe, iterations=200):
+    """ Runs GETs (plain and gzip), HEADs, POSTs and multipart uploads against a server on 127.0.0.1 """
+    server = _ThreadingHTTPServer(("127.0.0.1", 0), _TrainingHandler)
+    server.compressed = gzip.compress(_PAYLOAD)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = "http://127.0.0.1:%d" % server.server_address[1]
+    upload = tempfile.NamedTemporaryFile(suffix=".json", delete=False)
+    try:
+        upload.write(_PAYLOAD)
+        upload.close()
+        glob = "[1-%d]" % iterations
+        commands = [
+            ["-s", "%s/plain/%s" % (url, glob)],
+            ["-s", "--compressed", "%s/gzip/%s" % (url, glob)],
+            ["-s", "-I", "%s/head/%s" % (url, glob)],
+            ["-s", "-H", "Content-Type: application/json", "--data-binary", "@" + upload.name,
+             "%s/post/%s" % (url, glob)],
+            ["-s", "-F", "file=@" + upload.name, "%s/upload/%s" % (url, glob)],
+        ]
+        with open(os.devnull, "wb") as devnull:
+            for args in commands:
+                subprocess.check_call([curl_exe] + args, stdout=devnull)
+    finally:
+        os.remove(upload.name)
+        server.shutdown()
+        server.server_close()
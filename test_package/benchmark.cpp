@@ -0,0 +1,137 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <algorithm>
+#include <chrono>
+#include <vector>
+#include <curl/curl.h>
+#ifndef _WIN32
+#include <sys/resource.h>
+#endif
+
+static size_t discard_cb(char *ptr, size_t size, size_t nmemb, void *userdata)
+{
+  (void)ptr;
+  *(curl_off_t *)userdata += (curl_off_t)(size * nmemb);
+  return size * nmemb;
+}
+
+static long peak_rss_kb(void)
+{
+#ifndef _WIN32
+  struct rusage usage;
+  if(getrusage(RUSAGE_SELF, &usage) == 0) {
+#ifdef __APPLE__
+    return usage.ru_maxrss / 1024;
+#else
+    return usage.ru_maxrss;
+#endif
+  }
+#endif
+  return -1;
+}
+
+static double percentile(const std::vector<double> &sorted, double p)
+{
+  if(sorted.empty())
+    return 0.0;
+  size_t index = (size_t)(p * (double)(sorted.size() - 1) + 0.5);
+  return sorted[index];
+}
+
+int main(int argc, char **argv)
+{
+  if(argc < 4) {
+    fprintf(stderr, "usage: %s <url> <requests> <concurrency> [h2]\n", argv[0]);
+    return 1;
+  }
+  const char *url = argv[1];
+  int total = atoi(argv[2]);
+  int concurrency = atoi(argv[3]);
+  /* h2: HTTP/2 with prior knowledge, all transfers multiplexed over one connection */
+  bool http2 = argc > 4 && strcmp(argv[4], "h2") == 0;
+  if(total <= 0 || concurrency <= 0)
+    return 1;
+  if(concurrency > total)
+    concurrency = total;
+
+  curl_global_init(CURL_GLOBAL_DEFAULT);
+  curl_version_info_data *id = curl_version_info(CURLVERSION_NOW);
+
+  CURLM *multi = curl_multi_init();
+  curl_multi_setopt(multi, CURLMOPT_MAX_HOST_CONNECTIONS, (long)concurrency);
+  curl_multi_setopt(multi, CURLMOPT_PIPELINING, http2 ? CURLPIPE_MULTIPLEX : CURLPIPE_NOTHING);
+
+  curl_off_t bytes = 0;
+  std::vector<CURL *> handles;
+  for(int i = 0; i < concurrency; i++) {
+    CURL *easy = curl_easy_init();
+    curl_easy_setopt(easy, CURLOPT_URL, url);
+    curl_easy_setopt(easy, CURLOPT_WRITEFUNCTION, discard_cb);
+    curl_easy_setopt(easy, CURLOPT_WRITEDATA, &bytes);
+    if(http2) {
+      curl_easy_setopt(easy, CURLOPT_HTTP_VERSION, (long)CURL_HTTP_VERSION_2_PRIOR_KNOWLEDGE);
+      /* wait for the first connection instead of opening one per handle */
+      curl_easy_setopt(easy, CURLOPT_PIPEWAIT, 1L);
+    }
+    handles.push_back(easy);
+    curl_multi_add_handle(multi, easy);
+  }
+
+  int started = concurrency;
+  int completed = 0;
+  int failed = 0;
+  long connects = 0;
+  std::vector<double> latencies;
+  latencies.reserve(total);
+
+  std::chrono::steady_clock::time_point begin = std::chrono::steady_clock::now();
+  while(completed < total) {
+    int running = 0;
+    int queued = 0;
+    CURLMsg *msg;
+    curl_multi_perform(multi, &running);
+    while((msg = curl_multi_info_read(multi, &queued))) {
+      if(msg->msg != CURLMSG_DONE)
+        continue;
+      CURL *easy = msg->easy_handle;
+      double seconds = 0.0;
+      long num_connects = 0;
+      curl_easy_getinfo(easy, CURLINFO_TOTAL_TIME, &seconds);
+      curl_easy_getinfo(easy, CURLINFO_NUM_CONNECTS, &num_connects);
+      if(msg->data.result != CURLE_OK)
+        failed++;
+      latencies.push_back(seconds * 1000.0);
+      connects += num_connects;
+      completed++;
+      /* re-adding the same easy handle keeps its connection in the multi cache */
+      curl_multi_remove_handle(multi, easy);
+      if(started < total) {
+        curl_multi_add_handle(multi, easy);
+        started++;
+      }
+    }
+    if(completed < total)
+      curl_multi_wait(multi, NULL, 0, 100, NULL);
+  }
+  double elapsed = std::chrono::duration<double>(std::chrono::steady_clock::now() - begin).count();
+
+  for(size_t i = 0; i < handles.size(); i++)
+    curl_easy_cleanup(handles[i]);
+  curl_multi_cleanup(multi);
+
+  std::sort(latencies.begin(), latencies.end());
+  printf("{\"version\": \"%s\", \"http_version\": \"%s\", \"ssl_version\": \"%s\", \"features\": %d, "
+         "\"max_write_size\": %d, \"requests\": %d, \"concurrency\": %d, "
+         "\"failed\": %d, \"connections\": %ld, \"bytes\": %lld, "
+         "\"seconds\": %.6f, \"requests_per_sec\": %.2f, "
+         "\"latency_p50_ms\": %.3f, \"latency_p99_ms\": %.3f, \"peak_rss_kb\": %ld}\n",
+         id->version, http2 ? "2" : "1.1", id->ssl_version ? id->ssl_version : "", id->features,
+         CURL_MAX_WRITE_SIZE, total, concurrency,
+         failed, connects, (long long)bytes,
+         elapsed, elapsed > 0.0 ? total / elapsed : 0.0,
+         percentile(latencies, 0.50), percentile(latencies, 0.99), peak_rss_kb());
+
+  curl_global_cleanup();
+  return failed ? 2 : 0;
+}
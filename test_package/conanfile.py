@@ -1,26 +1,217 @@
 from conans import ConanFile, CMake, tools
 import os
+import sys
 import subprocess
 import re
+import json
+import ssl
+from loopback_server import LoopbackServer
+from h2c_server import H2cServer
+import memdump
+import footprint
 
 
 class TestPackageConan(ConanFile):
     settings = "os", "compiler", "build_type", "arch"
     generators = "cmake"
 
+    @property
+    def _measure_gc_sections(self):
+        return self.settings.os == "Linux" and str(self.options["libcurl"].gc_sections) == "True" and \
+            str(self.options["libcurl"].shared) == "False"
+
     def build(self):
         cmake = CMake(self)
+        cmake.definitions["LIBCURL_MEMORY_TRACKING"] = str(self.options["libcurl"].memory_tracking) == "True"
+        cmake.definitions["LIBCURL_GC_SECTIONS"] = self._measure_gc_sections
+        # the benchmark executables are only needed by the tests that run them
+        cmake.definitions["LIBCURL_BENCHMARK"] = bool(os.getenv("LIBCURL_BENCHMARK"))
+        cmake.definitions["LIBCURL_HTTP2_TEST"] = str(self.options["libcurl"].with_nghttp2) == "True"
         cmake.configure()
         cmake.build()
 
     def test(self):
         if "arm" in self.settings.arch:
             self.test_arm()
+            if self.settings.os == "Linux":
+                self.test_footprint()
+            if self._measure_gc_sections:
+                self.test_gc_sections()
         elif tools.cross_building(self.settings) and self.settings.os == "Windows":
             self.test_mingw_cross()
         else:
             bin_path = os.path.join("bin", "test_package")
+            disabled_protocols = str(self.options["libcurl"].disabled_protocols)
+            if disabled_protocols != "None":
+                bin_path = " ".join([bin_path] + disabled_protocols.split(","))
             self.run(bin_path, run_environment=True)
+            if os.getenv("LIBCURL_VERSION_INFO_OUTPUT"):
+                version_info = self._run_json([os.path.join("bin", "test_package"), "--json"])
+                tools.save(os.getenv("LIBCURL_VERSION_INFO_OUTPUT"), json.dumps(version_info, indent=4))
+            if self.settings.os == "Linux" and self.options["libcurl"].shared:
+                self.test_shared_load_cost()
+            if self.settings.os == "Linux":
+                self.test_footprint()
+            if self._measure_gc_sections:
+                self.test_gc_sections()
+            if str(self.options["libcurl"].with_nghttp2) == "True":
+                self.test_http2_multiplexing()
+            if str(self.options["libcurl"].memory_tracking) == "True":
+                self.test_memory_tracking()
+            if os.getenv("LIBCURL_BENCHMARK"):
+                self.test_benchmark()
+
+    def _run_json(self, args):
+        with tools.run_environment(self):
+            output = subprocess.check_output(args).decode()
+        return json.loads(output)
+
+    def test_http2_multiplexing(self):
+        # the same concurrent workload over HTTP/1.1 keep-alive and over one multiplexed HTTP/2 connection
+        requests = os.getenv("LIBCURL_BENCHMARK_REQUESTS", "1000")
+        concurrency = os.getenv("LIBCURL_BENCHMARK_CONCURRENCY", "16")
+        bin_path = os.path.join("bin", "benchmark")
+        with LoopbackServer() as server:
+            http1 = self._run_json([bin_path, server.url, requests, concurrency])
+        with H2cServer() as server:
+            try:
+                http2 = self._run_json([bin_path, server.url, requests, concurrency, "h2"])
+            except subprocess.CalledProcessError as error:
+                http2 = json.loads(error.output.decode())
+            server_connections = server.connections
+
+        assert http2["features"] & (1 << 16), "libcurl was built without HTTP/2 support (CURL_VERSION_HTTP2)"
+        assert http2["failed"] == 0, "%d of %s HTTP/2 transfers failed" % (http2["failed"], requests)
+        assert http2["connections"] == 1 and server_connections == 1, \
+            "%s concurrent HTTP/2 transfers used %d connections instead of one" % (concurrency, server_connections)
+        self.output.info("HTTP/1.1: %.2f requests/sec, p50 %.3f ms, p99 %.3f ms over %d connections"
+                         % (http1["requests_per_sec"], http1["latency_p50_ms"], http1["latency_p99_ms"],
+                            http1["connections"]))
+        self.output.info("HTTP/2:   %.2f requests/sec, p50 %.3f ms, p99 %.3f ms over 1 connection"
+                         % (http2["requests_per_sec"], http2["latency_p50_ms"], http2["latency_p99_ms"]))
+
+    def test_memory_tracking(self):
+        # replay the memdump log of a keep-alive loopback workload: allocation hot spots, peak and leaks
+        transfers = int(os.getenv("LIBCURL_MEMDUMP_TRANSFERS", "100"))
+        log_path = os.path.abspath("memdump.log")
+        with LoopbackServer() as server:
+            self._run_json([os.path.join("bin", "memory_workload"), server.url, str(transfers), log_path])
+        with open(log_path) as log_file:
+            report = memdump.analyze(log_file)
+        report["transfers"] = transfers
+        report_path = os.getenv("LIBCURL_MEMDUMP_REPORT", "memdump_report.json")
+        tools.save(report_path, json.dumps(report, indent=4))
+
+        self.output.info("%d allocations (%.1f per transfer), %d bytes, peak %d bytes live (%s)"
+                         % (report["allocations"], float(report["allocations"]) / transfers,
+                            report["allocated_bytes"], report["peak_live_bytes"], report_path))
+        for entry in report["locations"][:10]:
+            self.output.info("%8d allocations %10d bytes  %s"
+                             % (entry["allocations"], entry["bytes"], entry["location"]))
+        assert not report["leaks"], "%d bytes leaked: %s" \
+            % (report["leaked_bytes"], ", ".join(leak["location"] for leak in report["leaks"][:10]))
+        for kind in ["open_sockets", "open_files", "open_addrinfo"]:
+            assert not report[kind], "%s left open: %s" % (kind, ", ".join(report[kind]))
+
+    def test_benchmark(self):
+        # drive N concurrent keep-alive transfers through the multi interface against a loopback server
+        requests = os.getenv("LIBCURL_BENCHMARK_REQUESTS", "5000")
+        concurrency = os.getenv("LIBCURL_BENCHMARK_CONCURRENCY", "16")
+        bin_path = os.path.join("bin", "benchmark")
+        with LoopbackServer() as server:
+            report = self._run_json([bin_path, server.url, requests, concurrency])
+        # stream one large payload through the write callback to see the effect of max_write_size
+        payload_size = int(os.getenv("LIBCURL_BENCHMARK_PAYLOAD_MB", "256")) * 1024 * 1024
+        with LoopbackServer(payload_size=payload_size) as server:
+            report["write_path"] = self._run_json([os.path.join("bin", "write_benchmark"), server.url])
+        if report["ssl_version"] and tools.which("openssl"):
+            report["tls"] = self._tls_benchmark()
+        else:
+            self.output.warn("Skipping the TLS benchmark, it needs a TLS backend and the openssl command line tool")
+        report["shared"] = str(self.options["libcurl"].shared) == "True"
+        report_path = os.getenv("LIBCURL_BENCHMARK_OUTPUT", "benchmark.json")
+        tools.save(report_path, json.dumps(report, indent=4, sort_keys=True))
+        self.output.info("%.2f requests/sec, p50 %.3f ms, p99 %.3f ms, peak RSS %d KiB (%s)"
+                         % (report["requests_per_sec"], report["latency_p50_ms"],
+                            report["latency_p99_ms"], report["peak_rss_kb"], report_path))
+        self.output.info("write path: %d callbacks of up to %d bytes, %.2f MiB/s, %d bytes allocated per handle"
+                         % (report["write_path"]["callbacks"], report["write_path"]["largest_callback_bytes"],
+                            report["write_path"]["mib_per_sec"], report["write_path"]["handle_peak_bytes"]))
+
+    def test_shared_load_cost(self):
+        lib_path = os.path.join(self.deps_cpp_info["libcurl"].lib_paths[0], "libcurl.so")
+        output = subprocess.check_output(["nm", "-D", "--defined-only", lib_path]).decode()
+        # skip the absolute version node symbols, only count real exports
+        exported = [line.split()[-1] for line in output.splitlines() if line.split()[-2:-1] != ["A"]]
+        # only curl's own internals count, static dependencies (zlib, nghttp2...) export their API as well
+        internal = [symbol for symbol in exported if symbol.startswith(("Curl_", "curlx_"))]
+        if str(self.options["libcurl"].symbol_hiding) == "True":
+            assert not internal, "internal symbols exported: %s" % ", ".join(internal[:10])
+
+        # dlopen in fresh processes with RTLD_NOW, so symbol binding is part of the measurement
+        probe = "import ctypes, os, sys, time\n" \
+                "start = time.perf_counter()\n" \
+                "ctypes.CDLL(sys.argv[1], mode=os.RTLD_NOW)\n" \
+                "print(time.perf_counter() - start)\n"
+        timings = []
+        with tools.run_environment(self):
+            for _ in range(10):
+                timings.append(float(subprocess.check_output([sys.executable, "-c", probe, lib_path]).decode()))
+        timings.sort()
+        self.output.info("%d exported symbols (%d internal), dlopen median %.3f ms"
+                         % (len(exported), len(internal), timings[len(timings) // 2] * 1000.0))
+
+    def test_footprint(self):
+        # sizes are read with readelf, which handles every ELF target, so cross builds are covered too
+        shared = str(self.options["libcurl"].shared) == "True"
+        lib_path = os.path.join(self.deps_cpp_info["libcurl"].lib_paths[0], "libcurl.so" if shared else "libcurl.a")
+        report = footprint.inspect(os.path.realpath(lib_path))
+        if not shared:
+            # what a static consumer links in addition to the archive
+            report["link_libraries"] = [lib for lib in self.deps_cpp_info["libcurl"].libs if lib != "curl"]
+        report_path = os.getenv("LIBCURL_FOOTPRINT_OUTPUT", "footprint.json")
+        tools.save(report_path, json.dumps(report, indent=4, sort_keys=True))
+
+        sections = sorted(report["sections"].items(), key=lambda item: -item[1])
+        self.output.info("%s: %d KiB on disk, %s (%s)"
+                         % (report["library"], report["file_bytes"] // 1024,
+                            ", ".join("%s %d KiB" % (name, size // 1024) for name, size in sections[:5]), report_path))
+        if report["objects"]:
+            self.output.info("largest objects: %s" % ", ".join("%s %d KiB" % (entry["object"], entry["bytes"] // 1024)
+                                                              for entry in report["objects"][:5]))
+        if report["needed"]:
+            self.output.info("shared dependencies: %s" % ", ".join(report["needed"]))
+
+        budgets_path = os.getenv("LIBCURL_FOOTPRINT_BUDGETS")
+        if budgets_path:
+            violations = footprint.check_budgets(report, json.loads(tools.load(budgets_path)))
+            assert not violations, "footprint budgets exceeded:\n" + "\n".join(violations)
+
+    def test_gc_sections(self):
+        # the loaded size of the test program with and without dropping unreferenced libcurl sections
+        sizes = {}
+        for name in ["test_package", "test_package_no_gc"]:
+            sizes[name] = sum(footprint.inspect(os.path.join("bin", name))["sections"].values())
+        eliminated = sizes["test_package_no_gc"] - sizes["test_package"]
+        assert eliminated >= 0, "--gc-sections grew test_package by %d bytes" % -eliminated
+        self.output.info("--gc-sections: test_package %d KiB instead of %d KiB, %d KiB (%.1f%%) eliminated"
+                         % (sizes["test_package"] // 1024, sizes["test_package_no_gc"] // 1024, eliminated // 1024,
+                            100.0 * eliminated / sizes["test_package_no_gc"]))
+
+    def _tls_benchmark(self):
+        # handshake rate and resident memory per established connection against a local HTTPS server
+        self.run("openssl req -x509 -newkey rsa:2048 -nodes -days 1 -subj /CN=localhost "
+                 "-keyout key.pem -out cert.pem")
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain("cert.pem", "key.pem")
+        handshakes = os.getenv("LIBCURL_BENCHMARK_HANDSHAKES", "500")
+        connections = os.getenv("LIBCURL_BENCHMARK_TLS_CONNECTIONS", "64")
+        with LoopbackServer(ssl_context=context) as server:
+            tls = self._run_json([os.path.join("bin", "tls_benchmark"), server.url, handshakes, connections])
+        self.output.info("%s: %.2f handshakes/sec, p50 %.3f ms, %.1f KiB resident per connection"
+                         % (tls["ssl_version"], tls["handshakes_per_sec"], tls["handshake_p50_ms"],
+                            tls["rss_per_connection_kb"]))
+        return tls
 
     def test_mingw_cross(self):
         bin_path = os.path.join("bin", "test_package.exe")
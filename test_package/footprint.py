@@ -0,0 +1,79 @@
+import os
+import re
+import subprocess
+
+#   [ 1] .text             PROGBITS        0000000000000000 000040 0001a4 00  AX  0   0 16
+_SECTION = re.compile(r"^\s*\[\s*\d+\]\s+(\S+)\s+(\S+)\s+[0-9a-f]+\s+[0-9a-f]+\s+([0-9a-f]+)\s+[0-9a-f]+\s+"
+                      r"([A-Za-z]*)\s+\d+")
+_MEMBER = re.compile(r"^File: .*\((.+)\)$")
+_NEEDED = re.compile(r"\(NEEDED\)\s+Shared library: \[(.+)\]")
+
+
+def _section_group(name):
+    # -ffunction-sections / -fdata-sections emit .text.<function>, .rodata.<object>...
+    for group in [".text", ".rodata", ".data.rel.ro", ".data", ".bss", ".tbss", ".tdata", ".gcc_except_table"]:
+        if name == group or name.startswith(group + "."):
+            return group
+    return name
+
+
+def inspect(library_path, readelf="readelf"):
+    """ Size report of an ELF static archive or shared object, read with readelf so any target arch works
+
+    "sections" sums the loaded (SHF_ALLOC) sections by name, "objects" are the archive members by the size of
+    their loaded sections, "needed" are the DT_NEEDED entries of a shared object.
+    """
+    report = {"library": os.path.basename(library_path),
+              "file_bytes": os.path.getsize(library_path),
+              "sections": {},
+              "objects": [],
+              "needed": []}
+    output = subprocess.check_output([readelf, "-S", "-W", library_path]).decode()
+    objects = {}
+    member = None
+    for line in output.splitlines():
+        match = _MEMBER.match(line)
+        if match:
+            member = match.group(1)
+            objects.setdefault(member, 0)
+            continue
+        match = _SECTION.match(line)
+        if not match:
+            continue
+        name, section_type, size, flags = match.groups()
+        if "A" not in flags:
+            continue
+        group = _section_group(name)
+        report["sections"][group] = report["sections"].get(group, 0) + int(size, 16)
+        if member and section_type != "NOBITS":
+            objects[member] += int(size, 16)
+    report["objects"] = sorted(({"object": name, "bytes": size} for name, size in objects.items()),
+                               key=lambda entry: -entry["bytes"])
+    if not library_path.endswith(".a"):
+        output = subprocess.check_output([readelf, "-d", "-W", library_path]).decode()
+        report["needed"] = _NEEDED.findall(output)
+    return report
+
+
+def check_budgets(report, budgets):
+    """ Violations of a budgets dict, for example
+    {"library_kb": 700, "sections_kb": {".text": 450}, "object_kb": 40, "needed": ["libc.so.6", "libz.so.1"]}
+    """
+    violations = []
+    if "library_kb" in budgets and report["file_bytes"] > budgets["library_kb"] * 1024:
+        violations.append("%s is %d KiB, budget %d KiB" % (report["library"], report["file_bytes"] // 1024,
+                                                          budgets["library_kb"]))
+    for section, budget in budgets.get("sections_kb", {}).items():
+        size = report["sections"].get(section, 0)
+        if size > budget * 1024:
+            violations.append("%s is %d KiB, budget %d KiB" % (section, size // 1024, budget))
+    if "object_kb" in budgets:
+        for entry in report["objects"]:
+            if entry["bytes"] > budgets["object_kb"] * 1024:
+                violations.append("%s is %d KiB, budget %d KiB per object" % (entry["object"], entry["bytes"] // 1024,
+                                                                             budgets["object_kb"]))
+    if "needed" in budgets:
+        unexpected = [library for library in report["needed"] if library not in budgets["needed"]]
+        if unexpected:
+            violations.append("unexpected shared dependencies: %s" % ", ".join(unexpected))
+    return violations
@@ -0,0 +1,174 @@
+""" Minimal cleartext HTTP/2 server (prior knowledge, no TLS) answering every request with a fixed size payload
+
+Only the parts of RFC 7540 a libcurl client exercises are implemented: the connection preface, SETTINGS,
+HEADERS/CONTINUATION, DATA with connection and stream flow control, WINDOW_UPDATE, PING and GOAWAY. Request
+header blocks are never decoded, responses use HPACK literals without touching the dynamic table.
+"""
+import socket
+import struct
+import threading
+
+PREFACE = b"PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n"
+
+DATA, HEADERS, RST_STREAM, SETTINGS, PING, GOAWAY, WINDOW_UPDATE, CONTINUATION = 0x0, 0x1, 0x3, 0x4, 0x6, 0x7, \
+    0x8, 0x9
+END_STREAM, ACK, END_HEADERS = 0x1, 0x1, 0x4
+SETTINGS_INITIAL_WINDOW_SIZE, SETTINGS_MAX_FRAME_SIZE = 0x4, 0x5
+DEFAULT_WINDOW = 65535
+MAX_FRAME_SIZE = 16384
+
+
+def _frame(frame_type, flags, stream_id, payload=b""):
+    return struct.pack(">I", len(payload))[1:] + struct.pack(">BBI", frame_type, flags, stream_id) + payload
+
+
+def _response_headers(content_length):
+    # ":status: 200" is static table entry 8, content-length (entry 28) as literal without indexing
+    value = str(content_length).encode()
+    return b"\x88\x0f\x0d" + bytes([len(value)]) + value
+
+
+class _Connection(object):
+    def __init__(self, sock, payload_size):
+        self._sock = sock
+        self._payload = b"x" * payload_size
+        self._connection_window = DEFAULT_WINDOW
+        self._initial_window = DEFAULT_WINDOW
+        self._max_frame_size = MAX_FRAME_SIZE
+        # stream id -> [bytes sent, stream window]
+        self._pending = {}
+
+    def _recv_exact(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self._sock.recv(size - len(data))
+            if not chunk:
+                raise EOFError()
+            data += chunk
+        return data
+
+    def _flush(self):
+        """ Sends as much pending response data as the flow control windows allow """
+        out = []
+        for stream_id in sorted(self._pending):
+            state = self._pending[stream_id]
+            while state[0] < len(self._payload) and self._connection_window > 0 and state[1] > 0:
+                size = min(len(self._payload) - state[0], self._connection_window, state[1], self._max_frame_size)
+                end = state[0] + size == len(self._payload)
+                out.append(_frame(DATA, END_STREAM if end else 0, stream_id, self._payload[state[0]:state[0] + size]))
+                state[0] += size
+                state[1] -= size
+                self._connection_window -= size
+            if state[0] == len(self._payload):
+                del self._pending[stream_id]
+        if out:
+            self._sock.sendall(b"".join(out))
+
+    def _respond(self, stream_id):
+        if not self._payload:
+            self._sock.sendall(_frame(HEADERS, END_HEADERS | END_STREAM, stream_id, _response_headers(0)))
+            return
+        self._sock.sendall(_frame(HEADERS, END_HEADERS, stream_id, _response_headers(len(self._payload))))
+        self._pending[stream_id] = [0, self._initial_window]
+        self._flush()
+
+    def _on_settings(self, flags, payload):
+        if flags & ACK:
+            return
+        for offset in range(0, len(payload), 6):
+            identifier, value = struct.unpack(">HI", payload[offset:offset + 6])
+            if identifier == SETTINGS_INITIAL_WINDOW_SIZE:
+                for state in self._pending.values():
+                    state[1] += value - self._initial_window
+                self._initial_window = value
+            elif identifier == SETTINGS_MAX_FRAME_SIZE:
+                self._max_frame_size = value
+        self._sock.sendall(_frame(SETTINGS, ACK, 0))
+
+    def serve(self):
+        if self._recv_exact(len(PREFACE)) != PREFACE:
+            return
+        self._sock.sendall(_frame(SETTINGS, 0, 0))
+        # (stream id, flags) of a request whose header block continues in CONTINUATION frames
+        open_headers = None
+        while True:
+            header = self._recv_exact(9)
+            length = struct.unpack(">I", b"\0" + header[:3])[0]
+            frame_type, flags, stream_id = struct.unpack(">BBI", header[3:])
+            stream_id &= 0x7fffffff
+            payload = self._recv_exact(length) if length else b""
+
+            if frame_type == SETTINGS:
+                self._on_settings(flags, payload)
+            elif frame_type in (HEADERS, CONTINUATION):
+                if frame_type == HEADERS:
+                    open_headers = (stream_id, flags)
+                if flags & END_HEADERS:
+                    request_stream, request_flags = open_headers
+                    open_headers = None
+                    if request_flags & END_STREAM:
+                        self._respond(request_stream)
+            elif frame_type == DATA and flags & END_STREAM:
+                self._respond(stream_id)
+            elif frame_type == WINDOW_UPDATE:
+                increment = struct.unpack(">I", payload)[0] & 0x7fffffff
+                if stream_id == 0:
+                    self._connection_window += increment
+                elif stream_id in self._pending:
+                    self._pending[stream_id][1] += increment
+                self._flush()
+            elif frame_type == PING and not flags & ACK:
+                self._sock.sendall(_frame(PING, ACK, 0, payload))
+            elif frame_type == RST_STREAM:
+                self._pending.pop(stream_id, None)
+            elif frame_type == GOAWAY:
+                return
+
+
+class H2cServer(object):
+    """ HTTP/2 prior knowledge server on 127.0.0.1, counting the connections it accepted """
+
+    def __init__(self, payload_size=1024):
+        self._payload_size = payload_size
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.bind(("127.0.0.1", 0))
+        self._listener.listen(128)
+        self._thread = threading.Thread(target=self._accept)
+        self._thread.daemon = True
+        self.connections = 0
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%d/" % self._listener.getsockname()[1]
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self._listener.accept()
+            except OSError:
+                return
+            self.connections += 1
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            thread = threading.Thread(target=self._serve, args=(sock,))
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, sock):
+        try:
+            _Connection(sock, self._payload_size).serve()
+        except (EOFError, OSError):
+            pass
+        finally:
+            sock.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        try:
+            # wakes up the blocking accept()
+            self._listener.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._listener.close()
@@ -0,0 +1,69 @@
+import threading
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+
+class _LoopbackHandler(BaseHTTPRequestHandler):
+    # keep-alive, so the client can reuse its connections
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _send_payload(self, size):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        chunk = b"x" * min(size, 65536)
+        remaining = size
+        while remaining > 0:
+            self.wfile.write(chunk[:remaining])
+            remaining -= len(chunk)
+
+    def do_GET(self):
+        self._send_payload(self.server.payload_size)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if length:
+            self.rfile.read(length)
+        self._send_payload(self.server.payload_size)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class LoopbackServer(object):
+    """ HTTP/1.1 server bound to 127.0.0.1 on an ephemeral port, serving a fixed size payload
+
+    Serves HTTPS when given a server side ssl.SSLContext.
+    """
+
+    def __init__(self, payload_size=1024, ssl_context=None):
+        self._server = _ThreadingHTTPServer(("127.0.0.1", 0), _LoopbackHandler)
+        self._server.payload_size = payload_size
+        self._scheme = "http"
+        if ssl_context:
+            self._server.socket = ssl_context.wrap_socket(self._server.socket, server_side=True)
+            self._scheme = "https"
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+
+    @property
+    def url(self):
+        return "%s://127.0.0.1:%d/" % (self._scheme, self._server.server_address[1])
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._server.shutdown()
+        self._server.server_close()
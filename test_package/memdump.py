@@ -0,0 +1,102 @@
+import json
+import re
+import sys
+
+# the lines curl's memdebug.c writes for a CURLDEBUG build, e.g.
+#   MEM url.c:1842 malloc(64) = 0x55d0c2a4e2a0
+#   MEM transfer.c:311 realloc(0x55d0c2a4e2a0, 128) = 0x55d0c2a4e330
+#   FD connect.c:1399 socket() = 5
+_LINE = re.compile(r"^(MEM|FD|FILE|ADDR) (\S+):(\d+) (\w+)\((.*?)\)(?: \((\d+)\))?(?: = (.+))?$")
+
+
+def _allocation_size(function, arguments, dup_size):
+    if function == "malloc":
+        return int(arguments)
+    if function == "calloc":
+        count, size = arguments.split(",")
+        return int(count) * int(size)
+    if function == "realloc":
+        return int(arguments.split(",")[1])
+    # strdup and wcsdup log the size of the copy separately
+    return int(dup_size)
+
+
+def analyze(lines):
+    """ Replays a memdump log: allocations and bytes per source location, peak live bytes and leaks
+
+    Leaks are the allocations, sockets, FILEs and getaddrinfo() results still open at the end of the log, with
+    the location that created them.
+    """
+    live = {}
+    live_bytes = 0
+    peak_bytes = 0
+    locations = {}
+    open_sockets = {}
+    open_files = {}
+    open_addrinfo = {}
+    for line in lines:
+        match = _LINE.match(line.strip())
+        if not match:
+            continue
+        kind, source, line_number, function, arguments, dup_size, result = match.groups()
+        location = "%s:%s" % (source, line_number)
+        if kind == "FD":
+            if function in ("socket", "accept") and result and result != "-1":
+                open_sockets[result] = location
+            elif function == "socketpair":
+                for descriptor in re.findall(r"\d+", result or ""):
+                    open_sockets[descriptor] = location
+            elif function == "sclose":
+                open_sockets.pop(arguments, None)
+            continue
+        if kind == "FILE":
+            if function in ("fopen", "fdopen") and result and result not in ("(nil)", "0x0"):
+                open_files[result] = location
+            elif function == "fclose":
+                open_files.pop(arguments, None)
+            continue
+        if kind == "ADDR":
+            if function == "getaddrinfo" and result and result not in ("(nil)", "0x0"):
+                open_addrinfo[result] = location
+            elif function == "freeaddrinfo":
+                open_addrinfo.pop(arguments, None)
+            continue
+
+        if function == "free":
+            live_bytes -= live.pop(arguments, (0, None))[0]
+            continue
+        if function == "realloc":
+            live_bytes -= live.pop(arguments.split(",")[0].strip(), (0, None))[0]
+        size = _allocation_size(function, arguments, dup_size)
+        if result and result not in ("(nil)", "0x0"):
+            live[result] = (size, location)
+            live_bytes += size
+            peak_bytes = max(peak_bytes, live_bytes)
+        stats = locations.setdefault(location, {"allocations": 0, "bytes": 0})
+        stats["allocations"] += 1
+        stats["bytes"] += size
+
+    leaks = {}
+    for size, location in live.values():
+        leak = leaks.setdefault(location, {"allocations": 0, "bytes": 0})
+        leak["allocations"] += 1
+        leak["bytes"] += size
+    return {"allocations": sum(stats["allocations"] for stats in locations.values()),
+            "allocated_bytes": sum(stats["bytes"] for stats in locations.values()),
+            "peak_live_bytes": peak_bytes,
+            "locations": sorted(({"location": location, "allocations": stats["allocations"],
+                                  "bytes": stats["bytes"]} for location, stats in locations.items()),
+                                key=lambda entry: (-entry["allocations"], -entry["bytes"])),
+            "leaked_bytes": sum(leak["bytes"] for leak in leaks.values()),
+            "leaks": sorted(({"location": location, "allocations": leak["allocations"], "bytes": leak["bytes"]}
+                             for location, leak in leaks.items()), key=lambda entry: -entry["bytes"]),
+            "open_sockets": sorted(open_sockets.values()),
+            "open_files": sorted(open_files.values()),
+            "open_addrinfo": sorted(open_addrinfo.values())}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("usage: %s <memdump>" % sys.argv[0])
+    with open(sys.argv[1]) as memdump:
+        print(json.dumps(analyze(memdump), indent=4))
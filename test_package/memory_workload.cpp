@@ -0,0 +1,43 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <curl/curl.h>
+
+/* exported by CURLDEBUG builds (memory_tracking), memdebug.h is not installed */
+extern "C" CURL_EXTERN void curl_dbg_memdebug(const char *logname);
+
+static size_t discard_cb(char *ptr, size_t size, size_t nmemb, void *userdata)
+{
+  (void)ptr;
+  (void)userdata;
+  return size * nmemb;
+}
+
+/* runs <transfers> GETs on one easy handle, then cleans up everything, so whatever
+   is still allocated at the end of <memdump> leaked */
+int main(int argc, char **argv)
+{
+  if(argc < 4) {
+    fprintf(stderr, "usage: %s <url> <transfers> <memdump>\n", argv[0]);
+    return 1;
+  }
+  curl_dbg_memdebug(argv[3]);
+
+  curl_global_init(CURL_GLOBAL_DEFAULT);
+  CURL *curl = curl_easy_init();
+  if(!curl)
+    return 2;
+  curl_easy_setopt(curl, CURLOPT_URL, argv[1]);
+  curl_easy_setopt(curl, CURLOPT_WRITEFUNCTION, discard_cb);
+
+  int failed = 0;
+  int transfers = atoi(argv[2]);
+  for(int i = 0; i < transfers; i++) {
+    if(curl_easy_perform(curl) != CURLE_OK)
+      failed++;
+  }
+  curl_easy_cleanup(curl);
+  curl_global_cleanup();
+
+  printf("{\"transfers\": %d, \"failed\": %d}\n", transfers, failed);
+  return failed ? 3 : 0;
+}
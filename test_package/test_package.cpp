@@ -1,7 +1,21 @@
 #include <stdio.h>
+#include <string.h>
 #include <curl/curl.h>
 
-int main(void)
+static void print_json(const curl_version_info_data *id)
+{
+  const char *const *proto;
+  printf("{\"version\": \"%s\", \"ssl_version\": \"%s\", \"features\": %d, \"protocols\": [",
+         id->version, id->ssl_version ? id->ssl_version : "", id->features);
+  for(proto = id->protocols; *proto; proto++) {
+    printf("%s\"%s\"", proto == id->protocols ? "" : ", ", *proto);
+  }
+  printf("]}\n");
+}
+
+/* --json prints the version info as JSON, any other arguments are protocols
+   that must have been pruned from the build */
+int main(int argc, char **argv)
 {
   CURL *curl;
   int retval = 0;
@@ -10,12 +24,26 @@ int main(void)
   if (!id)
     return 1;
 
+  if(argc > 1 && strcmp(argv[1], "--json") == 0) {
+    print_json(id);
+    return 0;
+  }
+
   printf("protocols: ");
   for(proto = id->protocols; *proto; proto++) {
     printf("%s ", *proto);
   }
   printf("\nversion: %s\nssl version: %s\nfeatures: %d\n", id->version, id->ssl_version, id->features);
 
+  for(int i = 1; i < argc; i++) {
+    for(proto = id->protocols; *proto; proto++) {
+      if(strcmp(*proto, argv[i]) == 0) {
+        printf("Protocol %s should have been disabled\n", argv[i]);
+        return 4;
+      }
+    }
+  }
+
   curl = curl_easy_init();
   if(curl) {
     char errbuf[CURL_ERROR_SIZE];
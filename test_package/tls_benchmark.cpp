@@ -0,0 +1,122 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <algorithm>
+#include <chrono>
+#include <vector>
+#include <curl/curl.h>
+#ifdef __linux__
+#include <unistd.h>
+#endif
+
+static size_t discard_cb(char *ptr, size_t size, size_t nmemb, void *userdata)
+{
+  (void)ptr;
+  (void)userdata;
+  return size * nmemb;
+}
+
+/* current resident set size, only available on Linux */
+static long current_rss_kb(void)
+{
+#ifdef __linux__
+  long pages = -1;
+  FILE *statm = fopen("/proc/self/statm", "r");
+  if(statm) {
+    if(fscanf(statm, "%*s %ld", &pages) != 1)
+      pages = -1;
+    fclose(statm);
+  }
+  if(pages >= 0)
+    return pages * (sysconf(_SC_PAGESIZE) / 1024);
+#endif
+  return -1;
+}
+
+static CURL *tls_handle(const char *url)
+{
+  CURL *easy = curl_easy_init();
+  curl_easy_setopt(easy, CURLOPT_URL, url);
+  curl_easy_setopt(easy, CURLOPT_WRITEFUNCTION, discard_cb);
+  /* the loopback server uses a throwaway self-signed certificate */
+  curl_easy_setopt(easy, CURLOPT_SSL_VERIFYPEER, 0L);
+  curl_easy_setopt(easy, CURLOPT_SSL_VERIFYHOST, 0L);
+  return easy;
+}
+
+int main(int argc, char **argv)
+{
+  if(argc < 4) {
+    fprintf(stderr, "usage: %s <https url> <handshakes> <connections>\n", argv[0]);
+    return 1;
+  }
+  const char *url = argv[1];
+  int handshakes = atoi(argv[2]);
+  int connections = atoi(argv[3]);
+  if(handshakes <= 0 || connections <= 0)
+    return 1;
+
+  curl_global_init(CURL_GLOBAL_DEFAULT);
+  curl_version_info_data *id = curl_version_info(CURLVERSION_NOW);
+  int failed = 0;
+
+  /* handshake rate: a fresh connection for every transfer */
+  std::vector<double> handshake_ms;
+  CURL *easy = tls_handle(url);
+  curl_easy_setopt(easy, CURLOPT_FRESH_CONNECT, 1L);
+  curl_easy_setopt(easy, CURLOPT_FORBID_REUSE, 1L);
+  std::chrono::steady_clock::time_point begin = std::chrono::steady_clock::now();
+  for(int i = 0; i < handshakes; i++) {
+    double connect = 0.0, appconnect = 0.0;
+    if(curl_easy_perform(easy) != CURLE_OK) {
+      failed++;
+      continue;
+    }
+    curl_easy_getinfo(easy, CURLINFO_CONNECT_TIME, &connect);
+    curl_easy_getinfo(easy, CURLINFO_APPCONNECT_TIME, &appconnect);
+    handshake_ms.push_back((appconnect - connect) * 1000.0);
+  }
+  double elapsed = std::chrono::duration<double>(std::chrono::steady_clock::now() - begin).count();
+  curl_easy_cleanup(easy);
+  std::sort(handshake_ms.begin(), handshake_ms.end());
+
+  /* memory: keep N established TLS connections open in the multi connection cache */
+  long rss_before = current_rss_kb();
+  CURLM *multi = curl_multi_init();
+  curl_multi_setopt(multi, CURLMOPT_MAXCONNECTS, (long)connections);
+  std::vector<CURL *> handles;
+  for(int i = 0; i < connections; i++) {
+    CURL *handle = tls_handle(url);
+    handles.push_back(handle);
+    curl_multi_add_handle(multi, handle);
+  }
+  int running = 1;
+  while(running) {
+    curl_multi_perform(multi, &running);
+    if(running)
+      curl_multi_wait(multi, NULL, 0, 100, NULL);
+  }
+  CURLMsg *msg;
+  int queued = 0;
+  while((msg = curl_multi_info_read(multi, &queued))) {
+    if(msg->msg == CURLMSG_DONE && msg->data.result != CURLE_OK)
+      failed++;
+  }
+  long rss_after = current_rss_kb();
+  for(size_t i = 0; i < handles.size(); i++) {
+    curl_multi_remove_handle(multi, handles[i]);
+    curl_easy_cleanup(handles[i]);
+  }
+  curl_multi_cleanup(multi);
+
+  printf("{\"ssl_version\": \"%s\", \"handshakes\": %d, \"failed\": %d, "
+         "\"handshakes_per_sec\": %.2f, \"handshake_p50_ms\": %.3f, \"handshake_p99_ms\": %.3f, "
+         "\"connections\": %d, \"rss_per_connection_kb\": %.1f}\n",
+         id->ssl_version ? id->ssl_version : "", handshakes, failed,
+         elapsed > 0.0 ? handshakes / elapsed : 0.0,
+         handshake_ms.empty() ? 0.0 : handshake_ms[handshake_ms.size() / 2],
+         handshake_ms.empty() ? 0.0 : handshake_ms[(size_t)(0.99 * (double)(handshake_ms.size() - 1))],
+         connections, rss_before < 0 ? -1.0 : (double)(rss_after - rss_before) / connections);
+
+  curl_global_cleanup();
+  return failed ? 2 : 0;
+}
@@ -0,0 +1,120 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <chrono>
+#include <curl/curl.h>
+
+/* counting allocator: every block is prefixed with its size, so live and peak bytes are exact */
+#define HEADER_SIZE 16
+
+static size_t live_bytes = 0;
+static size_t peak_bytes = 0;
+
+static void *counting_malloc(size_t size)
+{
+  char *block = (char *)malloc(size + HEADER_SIZE);
+  if(!block)
+    return NULL;
+  memcpy(block, &size, sizeof(size));
+  live_bytes += size;
+  if(live_bytes > peak_bytes)
+    peak_bytes = live_bytes;
+  return block + HEADER_SIZE;
+}
+
+static void counting_free(void *ptr)
+{
+  if(!ptr)
+    return;
+  char *block = (char *)ptr - HEADER_SIZE;
+  size_t size;
+  memcpy(&size, block, sizeof(size));
+  live_bytes -= size;
+  free(block);
+}
+
+static void *counting_realloc(void *ptr, size_t size)
+{
+  if(!ptr)
+    return counting_malloc(size);
+  char *block = (char *)ptr - HEADER_SIZE;
+  size_t old_size;
+  memcpy(&old_size, block, sizeof(old_size));
+  char *new_block = (char *)realloc(block, size + HEADER_SIZE);
+  if(!new_block)
+    return NULL;
+  memcpy(new_block, &size, sizeof(size));
+  live_bytes = live_bytes - old_size + size;
+  if(live_bytes > peak_bytes)
+    peak_bytes = live_bytes;
+  return new_block + HEADER_SIZE;
+}
+
+static char *counting_strdup(const char *str)
+{
+  size_t size = strlen(str) + 1;
+  char *copy = (char *)counting_malloc(size);
+  if(copy)
+    memcpy(copy, str, size);
+  return copy;
+}
+
+static void *counting_calloc(size_t nmemb, size_t size)
+{
+  void *ptr = counting_malloc(nmemb * size);
+  if(ptr)
+    memset(ptr, 0, nmemb * size);
+  return ptr;
+}
+
+struct write_stats {
+  curl_off_t bytes;
+  long callbacks;
+  size_t largest;
+};
+
+static size_t count_cb(char *ptr, size_t size, size_t nmemb, void *userdata)
+{
+  struct write_stats *stats = (struct write_stats *)userdata;
+  (void)ptr;
+  stats->bytes += (curl_off_t)(size * nmemb);
+  stats->callbacks++;
+  if(size * nmemb > stats->largest)
+    stats->largest = size * nmemb;
+  return size * nmemb;
+}
+
+int main(int argc, char **argv)
+{
+  if(argc < 2) {
+    fprintf(stderr, "usage: %s <url>\n", argv[0]);
+    return 1;
+  }
+
+  curl_global_init_mem(CURL_GLOBAL_DEFAULT, counting_malloc, counting_free,
+                       counting_realloc, counting_strdup, counting_calloc);
+  size_t baseline = live_bytes;
+  peak_bytes = live_bytes;
+
+  struct write_stats stats = {0, 0, 0};
+  CURL *curl = curl_easy_init();
+  curl_easy_setopt(curl, CURLOPT_URL, argv[1]);
+  curl_easy_setopt(curl, CURLOPT_WRITEFUNCTION, count_cb);
+  curl_easy_setopt(curl, CURLOPT_WRITEDATA, &stats);
+
+  std::chrono::steady_clock::time_point begin = std::chrono::steady_clock::now();
+  CURLcode result = curl_easy_perform(curl);
+  double elapsed = std::chrono::duration<double>(std::chrono::steady_clock::now() - begin).count();
+
+  curl_easy_cleanup(curl);
+  curl_global_cleanup();
+
+  printf("{\"max_write_size\": %d, \"max_http_header\": %d, \"result\": %d, "
+         "\"bytes\": %lld, \"callbacks\": %ld, \"largest_callback_bytes\": %lu, "
+         "\"seconds\": %.6f, \"mib_per_sec\": %.2f, \"handle_peak_bytes\": %lu}\n",
+         CURL_MAX_WRITE_SIZE, CURL_MAX_HTTP_HEADER, (int)result,
+         (long long)stats.bytes, stats.callbacks, (unsigned long)stats.largest,
+         elapsed, elapsed > 0.0 ? (double)stats.bytes / elapsed / (1024.0 * 1024.0) : 0.0,
+         (unsigned long)(peak_bytes - baseline));
+  return result == CURLE_OK ? 0 : 2;
+}